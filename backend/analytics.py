@@ -0,0 +1,169 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from models import *
+from services import booking_service, services_service, InvalidQueryError
+import numpy as np
+
+# Default and longest windows of booking analytics, in days
+ANALYTICS_DEFAULT_DAYS = 90
+ANALYTICS_MAX_DAYS = 731
+
+STATUSES = [status.value for status in BookingStatus]
+CONVERTED_STATUSES = [BookingStatus.CONFIRMED.value, BookingStatus.COMPLETED.value]
+
+def bucket_starts(start: date, end: date, interval: AnalyticsInterval) -> List[date]:
+    """First day of every bucket overlapping the window; weeks start on Monday as in $dateTrunc"""
+    if interval == AnalyticsInterval.WEEK:
+        first, step = start - timedelta(days=start.weekday()), 7
+    else:
+        first, step = start, 1
+    return [first + timedelta(days=offset) for offset in range(0, (end - first).days + 1, step)]
+
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: List[float]) -> np.ndarray:
+    """Nearest-rank quantiles of values repeated weights times"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    ranks = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1])
+    return values[order][ranks]
+
+def people_distribution(values: np.ndarray, weights: np.ndarray) -> Dict:
+    """Histogram and summary of people per booking"""
+    total = int(weights.sum())
+    if total == 0:
+        return {"bookings": 0, "counts": {}, "mean": None, "median": None, "p90": None}
+    median, p90 = weighted_quantiles(values, weights, [0.5, 0.9])
+    order = np.argsort(values)
+    return {
+        "bookings": total,
+        "counts": {str(value): int(count) for value, count in zip(values[order], weights[order])},
+        "mean": round(float(np.average(values, weights=weights)), 2),
+        "median": int(median),
+        "p90": int(p90),
+    }
+
+def conversion(status_counts: np.ndarray) -> Dict:
+    """Share of bookings confirmed or completed, and cancelled, from counts ordered as STATUSES"""
+    total = int(status_counts.sum())
+    converted = sum(int(status_counts[STATUSES.index(status)]) for status in CONVERTED_STATUSES)
+    cancelled = int(status_counts[STATUSES.index(BookingStatus.CANCELLED.value)])
+    return {
+        "total": total,
+        "by_status": {status: int(count) for status, count in zip(STATUSES, status_counts)},
+        "conversion_rate": round(converted / total, 4) if total else 0.0,
+        "cancellation_rate": round(cancelled / total, 4) if total else 0.0,
+    }
+
+def service_of(group: Dict) -> Optional[str]:
+    """Service id of a group; bookings stored with an empty service_id count as having none"""
+    return group["_id"].get("service_id") or None
+
+class BookingAnalyticsService:
+    """Time-bucketed booking aggregates computed in MongoDB and shaped with NumPy"""
+    
+    def window(self, start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+        """Resolve and validate an inclusive window of days"""
+        end = end or date.today()
+        start = start or end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+        if end < start or (end - start).days >= ANALYTICS_MAX_DAYS:
+            raise InvalidQueryError(f"Range must span 1 to {ANALYTICS_MAX_DAYS} days")
+        return start, end
+    
+    def pipeline(self, start: date, end: date, interval: AnalyticsInterval, date_field: BookingDateField) -> List[Dict]:
+        field = date_field.value
+        truncate = {"date": f"${field}", "unit": interval.value}
+        if interval == AnalyticsInterval.WEEK:
+            truncate["startOfWeek"] = "monday"
+        people = {"$ifNull": ["$people_count", 1]}
+        return [
+            {"$match": booking_service.export_query(start=start, end=end, date_field=date_field)},
+            {"$facet": {
+                "series": [{"$group": {
+                    "_id": {"bucket": {"$dateTrunc": truncate}, "service_id": "$service_id"},
+                    "bookings": {"$sum": 1},
+                    "people": {"$sum": people},
+                }}],
+                "statuses": [{"$group": {
+                    "_id": {"service_id": "$service_id", "status": "$status"},
+                    "count": {"$sum": 1},
+                }}],
+                "people": [{"$group": {
+                    "_id": {"service_id": "$service_id", "people_count": people},
+                    "count": {"$sum": 1},
+                }}],
+            }},
+        ]
+    
+    async def get_booking_analytics(self, start: Optional[date] = None, end: Optional[date] = None,
+                                    interval: AnalyticsInterval = AnalyticsInterval.DAY,
+                                    date_field: BookingDateField = BookingDateField.CREATED_AT) -> BookingAnalytics:
+        """Bookings and people per bucket and service, conversion and party sizes over a window"""
+        start, end = self.window(start, end)
+        collection = await booking_service.get_collection()
+        result = await collection.aggregate(self.pipeline(start, end, interval, date_field)).to_list(length=1)
+        facets = result[0] if result else {"series": [], "statuses": [], "people": []}
+        
+        services = await services_service.get_all(projection={"title": 1})
+        titles = {service["_id"]: service["title"] for service in services}
+        # Services with bookings in the window, in catalog order, then unknown ids and no service last
+        seen = {service_of(group) for groups in facets.values() for group in groups}
+        service_ids = [service_id for service_id in titles if service_id in seen]
+        service_ids += sorted(service_id for service_id in seen if service_id and service_id not in titles)
+        if None in seen:
+            service_ids.append(None)
+        service_index = {service_id: index for index, service_id in enumerate(service_ids)}
+        
+        buckets = bucket_starts(start, end, interval)
+        step = 7 if interval == AnalyticsInterval.WEEK else 1
+        bookings = np.zeros((len(service_ids), len(buckets)), dtype=np.int64)
+        people = np.zeros_like(bookings)
+        if facets["series"]:
+            rows = np.array([service_index[service_of(group)] for group in facets["series"]])
+            columns = np.array([(group["_id"]["bucket"].date() - buckets[0]).days // step
+                                for group in facets["series"]])
+            np.add.at(bookings, (rows, columns), [group["bookings"] for group in facets["series"]])
+            np.add.at(people, (rows, columns), [group["people"] for group in facets["series"]])
+        
+        status_counts = np.zeros((len(service_ids), len(STATUSES)), dtype=np.int64)
+        for group in facets["statuses"]:
+            status = group["_id"].get("status")
+            if status in STATUSES:
+                status_counts[service_index[service_of(group)], STATUSES.index(status)] += group["count"]
+        
+        groups = facets["people"]
+        people_rows = np.array([service_index[service_of(group)] for group in groups], dtype=np.int64)
+        people_values = np.array([group["_id"]["people_count"] for group in groups], dtype=np.int64)
+        people_weights = np.array([group["count"] for group in groups], dtype=np.int64)
+        
+        def named(service_id: Optional[str], values: Dict) -> Dict:
+            return {"service_id": service_id, "title": titles.get(service_id), **values}
+        
+        return BookingAnalytics(
+            interval=interval,
+            date_field=date_field,
+            start=start,
+            end=end,
+            buckets=buckets,
+            series=[
+                named(service_id, {"bookings": bookings[index].tolist(), "people": people[index].tolist()})
+                for index, service_id in enumerate(service_ids)
+            ],
+            totals=bookings.sum(axis=0).tolist(),
+            conversion=[
+                named(service_id, conversion(status_counts[index])) for index, service_id in enumerate(service_ids)
+            ],
+            overall_conversion=conversion(status_counts.sum(axis=0)),
+            people=[
+                named(service_id, people_distribution(people_values[people_rows == index],
+                                                      people_weights[people_rows == index]))
+                for index, service_id in enumerate(service_ids)
+            ],
+            overall_people=people_distribution(*self._merge_counts(people_values, people_weights)),
+        )
+    
+    @staticmethod
+    def _merge_counts(values: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum the weights of equal values across services"""
+        unique, inverse = np.unique(values, return_inverse=True)
+        return unique, np.bincount(inverse, weights=weights, minlength=len(unique)).astype(np.int64)
+
+booking_analytics_service = BookingAnalyticsService()
@@ -1,21 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
+from pymongo import ASCENDING, IndexModel
 from jose import JWTError, jwt
 from models import User, UserResponse
-from database import get_collection, COLLECTIONS
+from database import get_collection, register_indexes, COLLECTIONS
+from cache import cache_invalidator
+import asyncio
 import os
+import time
 
 # Security
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '8'))
+
+# Authenticated principal cache
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_MAX_ENTRIES = 1024
+
+ADMIN_ROLES = ["admin", "moderator"]
+
+# Hashes with any other cost factor are reported as needing an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
+register_indexes(COLLECTIONS['users'], [IndexModel([("username", ASCENDING)], unique=True)])
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -24,6 +49,109 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt work in a bounded thread pool so it never blocks the event loop"""
+    
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    async def run(self, func: Callable, *args):
+        """Run a password function in the pool, rejecting work beyond the queue limit"""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again later",
+                headers={"Retry-After": "1"},
+            )
+        
+        submitted = time.perf_counter()
+        
+        def timed():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started - submitted, time.perf_counter() - started
+        
+        self.pending += 1
+        try:
+            result, wait, run = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+        
+        self.completed += 1
+        self.total_wait_seconds += wait
+        self.total_run_seconds += run
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        return result
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self.run(get_password_hash, password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password off the event loop, returning a new hash when the stored one is outdated"""
+        return await self.run(pwd_context.verify_and_update, plain_password, hashed_password)
+    
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": 1000 * self.total_wait_seconds / self.completed if self.completed else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_seconds,
+            "avg_run_ms": 1000 * self.total_run_seconds / self.completed if self.completed else 0.0,
+        }
+
+password_hasher = PasswordHasher()
+
+class PrincipalCache:
+    """Short-lived cache of authenticated users keyed by the token subject"""
+    
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[UserResponse, float]] = {}
+    
+    def get(self, username: str) -> Optional[UserResponse]:
+        entry = self._entries.get(username)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[username]
+            return None
+        return entry[0]
+    
+    def set(self, username: str, user: UserResponse):
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+        self._entries[username] = (user, time.monotonic() + self.ttl)
+    
+    def evict(self, username: str):
+        self._entries.pop(username, None)
+    
+    def clear(self):
+        self._entries.clear()
+
+principal_cache = PrincipalCache()
+
+def _on_collection_changed(collection_name: Optional[str]):
+    # Users are few, so any change or deactivation simply drops every principal
+    if collection_name in (None, COLLECTIONS['users']):
+        principal_cache.clear()
+
+cache_invalidator.add_listener(_on_collection_changed)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -50,39 +178,59 @@ async def authenticate_user(username: str, password: str) -> Optional[User]:
     user = await get_user_by_username(username)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
         return None
     
-    # Update last login
+    # Update last login, rehashing the password if the configured cost factor changed
+    update = {"last_login": datetime.utcnow(), "updated_at": datetime.utcnow()}
+    if new_hash:
+        update["password_hash"] = new_hash
     users_collection = await get_collection(COLLECTIONS['users'])
     await users_collection.update_one(
         {"_id": user.id},
-        {"$set": {"last_login": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+        {"$set": update}
     )
+    principal_cache.evict(user.username)
+    await cache_invalidator.touch(COLLECTIONS['users'])
     
     return user
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserResponse:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def permissions_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not enough permissions"
+    )
+
+async def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Decode and validate the bearer token"""
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+async def get_current_user(payload: dict = Depends(get_token_payload)) -> UserResponse:
+    """Get current authenticated user"""
+    username: str = payload["sub"]
+    principal = principal_cache.get(username)
+    if principal is not None:
+        return principal
     
     user = await get_user_by_username(username)
-    if user is None:
-        raise credentials_exception
+    if user is None or not user.is_active:
+        raise credentials_exception()
     
-    return UserResponse(
+    principal = UserResponse(
         id=user.id,
         username=user.username,
         email=user.email,
@@ -90,14 +238,19 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         role=user.role,
         last_login=user.last_login
     )
+    principal_cache.set(username, principal)
+    return principal
 
-async def get_current_admin_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
+async def get_current_admin_user(payload: dict = Depends(get_token_payload)) -> UserResponse:
     """Get current user and verify admin role"""
-    if current_user.role not in ["admin", "moderator"]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions"
-        )
+    # The role claim lets non-admin tokens be refused without any lookup
+    role = payload.get("role")
+    if role is not None and role not in ADMIN_ROLES:
+        raise permissions_exception()
+    
+    current_user = await get_current_user(payload)
+    if current_user.role not in ADMIN_ROLES:
+        raise permissions_exception()
     return current_user
 
 async def create_default_admin():
@@ -112,7 +265,7 @@ async def create_default_admin():
         default_admin = User(
             username="admin",
             email="admin@alpaca-lulu.ru",
-            password_hash=get_password_hash("admin123"),
+            password_hash=await password_hasher.hash("admin123"),
             full_name="Администратор",
             role="admin",
             is_active=True
@@ -0,0 +1,274 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+from pydantic import BaseModel
+from pymongo.errors import OperationFailure, PyMongoError
+from database import get_collection, get_database, COLLECTIONS, READ_MAX_STALENESS_SECONDS
+import asyncio
+import hashlib
+import logging
+import orjson
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Response cache settings
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '300'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '512'))
+CACHE_POLL_INTERVAL_SECONDS = float(os.environ.get('CACHE_POLL_INTERVAL_SECONDS', '5'))
+# Entries rebuilt this soon after an invalidation may come from a secondary that has not
+# applied the write yet, so they expire when the window ends instead of after the full TTL.
+# Secondaries serving reads lag at most READ_MAX_STALENESS_SECONDS behind the primary.
+CACHE_REPLICA_LAG_SECONDS = float(os.environ.get('CACHE_REPLICA_LAG_SECONDS', str(READ_MAX_STALENESS_SECONDS)))
+CACHE_WATCH_RETRY_SECONDS = 5
+# Updates touching only these fields leave cached responses alone: blog post views are
+# flushed every few seconds and would otherwise evict the blog and bootstrap entries each time
+CACHE_IGNORED_FIELDS = frozenset({"views"})
+
+def _encode_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def serialize_json(content) -> bytes:
+    """Serialize documents or models straight to JSON bytes"""
+    # orjson handles datetimes and enums natively, matching FastAPI's output
+    return orjson.dumps(content, default=_encode_default)
+
+class CachedResponse:
+    """Already-serialized JSON response body with its validators and extra headers"""
+    
+    __slots__ = ("body", "headers", "etag", "last_modified")
+    
+    def __init__(self, body: bytes, headers: Dict[str, str] = None, validator: bytes = None):
+        self.body = body
+        self.headers = headers or {}
+        if validator is None:
+            # Strong validator: identical bodies get identical tags in every worker
+            self.etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        else:
+            # Weak validator over the meaningful part of a body whose other fields change constantly
+            self.etag = 'W/"%s"' % hashlib.blake2b(validator, digest_size=16).hexdigest()
+        # Set when the response is stored in the cache, i.e. when this representation was built
+        self.last_modified: Optional[datetime] = None
+    
+    @classmethod
+    def from_content(cls, content, headers: Dict[str, str] = None, validator_content=None) -> "CachedResponse":
+        validator = serialize_json(validator_content) if validator_content is not None else None
+        return cls(serialize_json(content), headers, validator)
+
+class _Entry:
+    __slots__ = ("value", "tags", "expires_at")
+    
+    def __init__(self, value: CachedResponse, tags: frozenset, expires_at: float):
+        self.value = value
+        self.tags = tags
+        self.expires_at = expires_at
+
+class ResponseCache:
+    """In-process LRU cache of serialized responses with a TTL and tag-based invalidation"""
+    
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self._invalidated_at: Dict[str, float] = {}
+        self._cleared_at = float("-inf")
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Get a fresh entry, or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+    
+    def set(self, key: Hashable, value: CachedResponse, tags: Iterable[str] = ()):
+        """Store an entry tagged with its source collections, evicting the least recently used past the size bound"""
+        if value.last_modified is None:
+            value.last_modified = datetime.utcnow().replace(microsecond=0)
+        tags = frozenset(tags)
+        now = time.monotonic()
+        invalidated_at = max([self._cleared_at] + [self._invalidated_at.get(tag, float("-inf")) for tag in tags])
+        expires_at = now + self.ttl
+        if now < invalidated_at + CACHE_REPLICA_LAG_SECONDS:
+            expires_at = min(expires_at, invalidated_at + CACHE_REPLICA_LAG_SECONDS)
+        self._entries[key] = _Entry(value, tags, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[CachedResponse]],
+                          tags: Iterable[str] = ()) -> CachedResponse:
+        """Get an entry, building it with loader on a miss"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        
+        self.misses += 1
+        # Concurrent misses for the same key share a single load
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # Do not store a result that an invalidation raced with
+            if generation == self._generation:
+                self.set(key, value, tags)
+            return value
+        finally:
+            del self._loading[key]
+    
+    def invalidate(self, *tags: str):
+        """Evict every entry built from any of the given tags"""
+        self._generation += 1
+        now = time.monotonic()
+        for tag in tags:
+            self._invalidated_at[tag] = now
+        tags = set(tags)
+        for key in [key for key, entry in self._entries.items() if entry.tags & tags]:
+            del self._entries[key]
+    
+    def clear(self):
+        """Evict every entry"""
+        self._generation += 1
+        self._cleared_at = time.monotonic()
+        self._entries.clear()
+    
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+class CacheInvalidator:
+    """Evicts cache entries in every worker when the watched collections change"""
+    
+    # Uses a change stream when the deployment supports it (replica sets) and
+    # otherwise polls per-collection version stamps bumped by the write paths
+    
+    def __init__(self, cache: ResponseCache, collections: Iterable[str]):
+        self.cache = cache
+        self.collections = list(collections)
+        self.mode: Optional[str] = None
+        self._versions: Dict[str, int] = {}
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    def add_listener(self, listener: Callable[[Optional[str]], None]):
+        """Also call listener with the collection name (None for all) on every eviction"""
+        self._listeners.append(listener)
+    
+    async def start(self):
+        """Start watching in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background watcher"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def touch(self, collection_name: str):
+        """Bump the version stamp of a collection after a write, when polling is in use"""
+        if self.mode == "change_stream" or collection_name not in self.collections:
+            return
+        versions = await get_collection(COLLECTIONS['cache_versions'])
+        await versions.update_one({"_id": collection_name}, {"$inc": {"version": 1}}, upsert=True)
+    
+    def evict(self, collection_name: Optional[str]):
+        """Evict entries built from a collection, or everything when it is unknown"""
+        if collection_name:
+            self.cache.invalidate(collection_name)
+        else:
+            self.cache.clear()
+        for listener in self._listeners:
+            listener(collection_name)
+    
+    @staticmethod
+    def is_ignored(change: Dict) -> bool:
+        """Whether a change event only updates fields cached responses may show stale"""
+        if change.get("operationType") != "update":
+            return False
+        description = change.get("updateDescription") or {}
+        updated = description.get("updatedFields") or {}
+        return bool(updated) and not description.get("removedFields") and set(updated) <= CACHE_IGNORED_FIELDS
+    
+    async def _run(self):
+        database = await get_database()
+        pipeline = [{"$match": {"ns.coll": {"$in": self.collections}}}]
+        while True:
+            try:
+                async with database.watch(pipeline) as stream:
+                    if self.mode != "change_stream":
+                        logger.info("Watching change streams for cache invalidation")
+                    self.mode = "change_stream"
+                    async for change in stream:
+                        if not self.is_ignored(change):
+                            self.evict(change.get("ns", {}).get("coll"))
+            except OperationFailure as exc:
+                if self.mode is None:
+                    # Standalone mongod: change streams are not supported at all
+                    logger.info("Change streams unavailable (%s), polling cache versions", exc)
+                    self.mode = "polling"
+                    await self._poll_versions()
+                    return
+                logger.warning("Cache invalidation change stream failed: %s", exc)
+            except PyMongoError as exc:
+                logger.warning("Cache invalidation change stream failed: %s", exc)
+            
+            # Changes may have been missed while the stream was down
+            self.evict(None)
+            await asyncio.sleep(CACHE_WATCH_RETRY_SECONDS)
+    
+    async def _poll_versions(self):
+        versions = await get_collection(COLLECTIONS['cache_versions'])
+        baseline_loaded = False
+        while True:
+            try:
+                async for doc in versions.find({"_id": {"$in": self.collections}}):
+                    previous = self._versions.get(doc["_id"])
+                    self._versions[doc["_id"]] = doc["version"]
+                    # A stamp appearing after the baseline was taken is a write as well
+                    if previous != doc["version"] and (previous is not None or baseline_loaded):
+                        self.evict(doc["_id"])
+                baseline_loaded = True
+            except PyMongoError as exc:
+                logger.warning("Cache version polling failed: %s", exc)
+            await asyncio.sleep(CACHE_POLL_INTERVAL_SECONDS)
+
+# Shared cache of public read-mostly responses
+response_cache = ResponseCache()
+
+# Keeps response_cache consistent across uvicorn workers
+cache_invalidator = CacheInvalidator(
+    response_cache,
+    [name for key, name in COLLECTIONS.items() if key not in ('stats', 'cache_versions', 'availability', 'idempotency_keys', 'rate_limits', 'blobs')]
+)
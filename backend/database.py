@@ -1,12 +1,147 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+logger = logging.getLogger(__name__)
+
+# Connection pool settings; unset ones keep the driver defaults
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': ('MONGO_MAX_POOL_SIZE', int),
+    'minPoolSize': ('MONGO_MIN_POOL_SIZE', int),
+    'maxIdleTimeMS': ('MONGO_MAX_IDLE_TIME_MS', int),
+    'waitQueueTimeoutMS': ('MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    'serverSelectionTimeoutMS': ('MONGO_SERVER_SELECTION_TIMEOUT_MS', int),
+    'connectTimeoutMS': ('MONGO_CONNECT_TIMEOUT_MS', int),
+    'socketTimeoutMS': ('MONGO_SOCKET_TIMEOUT_MS', int),
+    # e.g. "zstd,snappy,zlib"; zstd needs the zstandard package, snappy python-snappy
+    'compressors': ('MONGO_COMPRESSORS', str),
+    'readPreference': ('MONGO_READ_PREFERENCE', str),
+    'maxStalenessSeconds': ('MONGO_MAX_STALENESS_SECONDS', int),
+}
+DEFAULT_MAX_POOL_SIZE = 100
+
+# Bound on replica lag for reads routed to secondaries (MongoDB requires at least 90)
+READ_MAX_STALENESS_SECONDS = int(os.environ.get('READ_MAX_STALENESS_SECONDS', '90'))
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+def read_preference_from_name(name: str):
+    """Build a read preference from its name, bounding staleness of secondary reads"""
+    mode = READ_PREFERENCES[name]
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=READ_MAX_STALENESS_SECONDS)
+
+def mongo_client_options() -> Dict[str, Any]:
+    """Read the MongoClient options configured in the environment"""
+    options = {}
+    for option, (env_name, cast) in MONGO_CLIENT_OPTIONS.items():
+        value = os.environ.get(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+class PoolMetrics(ConnectionPoolListener):
+    """CMAP listener tracking connection checkout waits and pool saturation"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Checkout start and end are reported on the same driver thread
+        self._local = threading.local()
+        self.max_pool_size = DEFAULT_MAX_POOL_SIZE
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def _checkout_finished(self, failed: bool):
+        started = getattr(self._local, "started", None)
+        wait = time.perf_counter() - started if started is not None else 0.0
+        self._local.started = None
+        with self._lock:
+            if failed:
+                self.checkout_failures += 1
+                return
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+    
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+    
+    def connection_check_out_failed(self, event):
+        self._checkout_finished(failed=True)
+    
+    def connection_checked_out(self, event):
+        self._checkout_finished(failed=False)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open_connections": self.open,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "saturation": self.checked_out / self.max_pool_size if self.max_pool_size else 0.0,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": 1000 * self.total_wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "max_checkout_wait_ms": 1000 * self.max_wait_seconds,
+            }
+
+pool_metrics = PoolMetrics()
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database: Optional[AsyncIOMotorDatabase] = None
@@ -21,9 +156,16 @@ async def connect_to_mongo():
     mongo_url = os.environ.get('MONGO_URL')
     db_name = os.environ.get('DB_NAME', 'alpaca_farm')
     
-    db.client = AsyncIOMotorClient(mongo_url)
+    options = mongo_client_options()
+    pool_metrics.max_pool_size = options.get('maxPoolSize', DEFAULT_MAX_POOL_SIZE)
+    
+    db.client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_metrics], **options)
     db.database = db.client[db_name]
     
+    # Warm up: concurrent pings open several connections before the first request
+    warmup_connections = max(1, options.get('minPoolSize', 0))
+    await asyncio.gather(*[db.client.admin.command('ping') for _ in range(warmup_connections)])
+    
     print(f"Connected to MongoDB: {db_name}")
 
 async def close_mongo_connection():
@@ -47,5 +189,69 @@ COLLECTIONS = {
     'news': 'news',
     'gallery': 'gallery',
     'bookings': 'bookings',
-    'users': 'users'
-}
\ No newline at end of file
+    'availability': 'availability',
+    'idempotency_keys': 'idempotency_keys',
+    'rate_limits': 'rate_limits',
+    'blobs': 'blobs',
+    'users': 'users',
+    'stats': 'stats',
+    'cache_versions': 'cache_versions'
+}
+
+# Index registry: indexes declared by the services for the queries they issue
+INDEXES: Dict[str, List[IndexModel]] = {}
+
+def register_indexes(collection_name: str, indexes: List[IndexModel]):
+    """Declare indexes a collection needs; ensure_indexes creates them at startup"""
+    registered = INDEXES.setdefault(collection_name, [])
+    names = {index.document["name"] for index in registered}
+    registered.extend(index for index in indexes if index.document["name"] not in names)
+
+async def index_report() -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared indexes with the database: missing, unused and undeclared ones"""
+    database = await get_database()
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = database[collection_name]
+        declared = [index.document["name"] for index in indexes]
+        existing = await collection.index_information()
+        
+        # $indexStats counts accesses since the last mongod restart
+        unused = []
+        try:
+            async for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                    unused.append(stats["name"])
+        except OperationFailure as exc:
+            logger.warning("Index usage unavailable for %s: %s", collection_name, exc)
+        
+        report[collection_name] = {
+            "missing": [name for name in declared if name not in existing],
+            "unused": sorted(unused),
+            "undeclared": sorted(name for name in existing if name != "_id_" and name not in declared),
+        }
+    return report
+
+async def ensure_indexes() -> Dict[str, Dict[str, List[str]]]:
+    """Create missing declared indexes and log what is still missing or unused"""
+    database = await get_database()
+    for collection_name, indexes in INDEXES.items():
+        existing = await database[collection_name].index_information()
+        missing = [index for index in indexes if index.document["name"] not in existing]
+        if not missing:
+            continue
+        try:
+            await database[collection_name].create_indexes(missing)
+            logger.info("Created indexes on %s: %s", collection_name,
+                        ", ".join(index.document["name"] for index in missing))
+        except OperationFailure as exc:
+            # E.g. duplicate slugs under a unique index; the app keeps working without it
+            logger.error("Failed to create indexes on %s: %s", collection_name, exc)
+    
+    report = await index_report()
+    for collection_name, status in report.items():
+        if status["missing"]:
+            logger.warning("Missing indexes on %s: %s", collection_name, ", ".join(status["missing"]))
+        if status["unused"]:
+            logger.info("Unused indexes on %s: %s", collection_name, ", ".join(status["unused"]))
+    return report
@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+import asyncio
+import csv
+import io
+import re
+import tempfile
+
+# Rows buffered before a CSV chunk is sent
+EXPORT_CHUNK_ROWS = 200
+# Bytes per chunk when streaming a finished XLSX file
+EXPORT_FILE_CHUNK_BYTES = 64 * 1024
+# XLSX files are spooled in memory up to this size, then on disk
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+# Exported booking columns: (header, document field)
+BOOKING_EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ("ID", "_id"),
+    ("Создана", "created_at"),
+    ("Статус", "status"),
+    ("Имя", "name"),
+    ("Телефон", "phone"),
+    ("Email", "email"),
+    ("Услуга", "service_id"),
+    ("Желаемая дата", "preferred_date"),
+    ("Количество человек", "people_count"),
+    ("Сообщение", "message"),
+    ("Заметки администратора", "admin_notes"),
+]
+
+# Spreadsheet apps run cells starting with these as formulas; phone numbers are allowed through
+FORMULA_PREFIX = re.compile(r"^(?:[=@\t\r]|[+-](?![\d\s()-]*$))")
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def xlsx_available() -> bool:
+    """Whether openpyxl is installed"""
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def export_row(document: Dict, columns: List[Tuple[str, str]], service_titles: Dict[str, str]) -> List:
+    """Cell values of one document"""
+    row = []
+    for _, field in columns:
+        value = document.get(field)
+        if field == "service_id" and value:
+            value = service_titles.get(value, value)
+        if isinstance(value, str) and FORMULA_PREFIX.match(value):
+            value = "'" + value
+        row.append(value)
+    return row
+
+def _csv_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+async def csv_chunks(documents: AsyncIterator[Dict], columns: List[Tuple[str, str]],
+                     row: Callable[[Dict], List]) -> AsyncIterator[bytes]:
+    """Encode documents as CSV, a few hundred rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # The BOM makes Excel open the file as UTF-8 instead of the system code page
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _ in columns])
+    rows = 0
+    async for document in documents:
+        writer.writerow([_csv_cell(value) for value in row(document)])
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+async def xlsx_chunks(documents: AsyncIterator[Dict], columns: List[Tuple[str, str]],
+                      row: Callable[[Dict], List]) -> AsyncIterator[bytes]:
+    """Write documents to a write-only workbook, which keeps rows on disk, then stream the file"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Заявки")
+    sheet.append([header for header, _ in columns])
+    async for document in documents:
+        sheet.append(row(document))
+    
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as file:
+        await asyncio.to_thread(workbook.save, file)
+        file.seek(0)
+        while True:
+            chunk = file.read(EXPORT_FILE_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+EXPORT_WRITERS = {"csv": csv_chunks, "xlsx": xlsx_chunks}
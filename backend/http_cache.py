@@ -0,0 +1,76 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from cache import CachedResponse
+import os
+
+# Default Cache-Control per public route. Each can be overridden with an
+# environment variable, e.g. CACHE_CONTROL_SITE_INFO="public, max-age=600".
+DEFAULT_CACHE_CONTROL = {
+    "bootstrap": "public, max-age=60, stale-while-revalidate=600",
+    "site-info": "public, max-age=300, stale-while-revalidate=86400",
+    "services": "public, max-age=60, stale-while-revalidate=3600",
+    "service": "public, max-age=60, stale-while-revalidate=3600",
+    # Places change with every booking
+    "availability": "public, max-age=10",
+    "gallery": "public, max-age=300, stale-while-revalidate=86400",
+    "news": "public, max-age=60, stale-while-revalidate=600",
+    "blog-posts": "public, max-age=60, stale-while-revalidate=600",
+    # Every full read counts a view, so make clients revalidate instead of reusing silently
+    "blog-post": "public, no-cache",
+    "blog-facets": "public, max-age=300, stale-while-revalidate=3600",
+    "reviews": "public, max-age=60, stale-while-revalidate=600",
+    "search": "public, max-age=60, stale-while-revalidate=600",
+    # Admin only: revalidated by ETag, never kept by shared caches
+    "booking-analytics": "private, no-cache",
+}
+
+def cache_control(route: str) -> str:
+    """Get the Cache-Control policy of a public route"""
+    env_name = "CACHE_CONTROL_" + route.upper().replace("-", "_")
+    return os.environ.get(env_name, DEFAULT_CACHE_CONTROL.get(route, "no-cache"))
+
+def http_date(value) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an entity tag"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def is_not_modified(request: Request, cached: CachedResponse) -> bool:
+    """Check the request validators against the response, If-None-Match taking precedence"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, cached.etag)
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and cached.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return cached.last_modified.replace(tzinfo=timezone.utc) <= since
+    return False
+
+def conditional_response(request: Request, cached: CachedResponse, route: str) -> Response:
+    """Build the JSON response for a public route, or a bodiless 304 when the client copy is current"""
+    headers = dict(cached.headers)
+    headers["ETag"] = cached.etag
+    headers["Cache-Control"] = cache_control(route)
+    if cached.last_modified:
+        headers["Last-Modified"] = http_date(cached.last_modified)
+    
+    if is_not_modified(request, cached):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
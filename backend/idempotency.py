@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+from cache import serialize_json
+from database import get_collection, register_indexes, COLLECTIONS
+import asyncio
+import hashlib
+import os
+import re
+
+# How long a response is replayed for the same Idempotency-Key
+IDEMPOTENCY_KEY_TTL_SECONDS = float(os.environ.get('IDEMPOTENCY_KEY_TTL_SECONDS', '86400'))
+# Window in which a submission with the same content is treated as a resubmission
+DEDUP_WINDOW_SECONDS = float(os.environ.get('DEDUP_WINDOW_SECONDS', '600'))
+# How long a retry waits for the original request to finish before getting a 409
+IDEMPOTENCY_WAIT_SECONDS = 2.0
+# A claim without a response after this long belongs to a request that died, and may be taken over
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '30'))
+IDEMPOTENCY_POLL_SECONDS = 0.1
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Records are removed by the TTL monitor once expires_at has passed
+register_indexes(COLLECTIONS['idempotency_keys'], [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)])
+
+def request_hash(*parts: Any) -> str:
+    """Stable hash of request payloads or values"""
+    return hashlib.sha256(serialize_json(parts)).hexdigest()
+
+def normalize_phone(phone: str) -> str:
+    """Digits of a phone number, so formatting differences do not defeat deduplication"""
+    digits = re.sub(r"\D", "", phone)
+    # 8XXXXXXXXXX and +7XXXXXXXXXX are the same Russian number
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+def in_progress_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="The same request is still being processed",
+        headers={"Retry-After": "1"},
+    )
+
+class IdempotencyStore:
+    """Remembers responses of create requests so that retries replay them instead of writing again"""
+    
+    async def get_collection(self):
+        return await get_collection(COLLECTIONS['idempotency_keys'])
+    
+    async def _claim(self, record_id: str, fingerprint: str, ttl: float) -> Optional[Dict]:
+        """Claim a record for this request, or return the live record of an earlier one"""
+        collection = await self.get_collection()
+        now = datetime.utcnow()
+        record = {"_id": record_id, "fingerprint": fingerprint, "response": None, "created_at": now,
+                  "claimed_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                  "expires_at": now + timedelta(seconds=ttl)}
+        for _ in range(2):
+            try:
+                await collection.insert_one(record)
+                return None
+            except DuplicateKeyError:
+                existing = await collection.find_one({"_id": record_id})
+                if existing is None:
+                    continue
+                abandoned = existing["response"] is None and existing.get("claimed_until", now) < now
+                if existing["expires_at"] > now and not abandoned:
+                    return existing
+                # Expired but not removed yet (the TTL monitor only runs once a minute),
+                # or claimed by a request that never stored its response
+                await collection.delete_one({"_id": record_id, "created_at": existing["created_at"]})
+        raise in_progress_exception()
+    
+    async def _wait_for_response(self, record_id: str) -> Dict:
+        """Wait for a concurrent request holding the record to store its response"""
+        collection = await self.get_collection()
+        for _ in range(int(IDEMPOTENCY_WAIT_SECONDS / IDEMPOTENCY_POLL_SECONDS)):
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+            record = await collection.find_one({"_id": record_id}, {"response": 1})
+            if record is None:
+                break
+            if record["response"] is not None:
+                return record["response"]
+        raise in_progress_exception()
+    
+    async def run(self, record_id: str, fingerprint: str, ttl: float,
+                  handler: Callable[[], Awaitable[Dict]]) -> Tuple[Dict, bool]:
+        """Run the handler at most once per record, returning its response and whether it was replayed"""
+        existing = await self._claim(record_id, fingerprint, ttl)
+        if existing is not None:
+            if existing["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+            if existing["response"] is None:
+                return await self._wait_for_response(record_id), True
+            return existing["response"], True
+        
+        collection = await self.get_collection()
+        try:
+            response = await handler()
+        except BaseException:
+            # Failed or cancelled before completing, so a retry must be able to run the request again;
+            # shielded so that a cancellation does not also cancel the cleanup
+            await asyncio.shield(collection.delete_one({"_id": record_id, "response": None}))
+            raise
+        await collection.update_one({"_id": record_id}, {"$set": {"response": response}})
+        return response, False
+    
+    async def submit(self, scope: str, payload: Any, handler: Callable[[], Awaitable[Dict]],
+                     idempotency_key: Optional[str] = None, dedup: Tuple = None) -> Tuple[Dict, bool]:
+        """Create once per Idempotency-Key and once per duplicate content within the window"""
+        steps: List[Tuple[str, str, float]] = []
+        if idempotency_key:
+            steps.append((f"{scope}:key:{idempotency_key}", request_hash(payload), IDEMPOTENCY_KEY_TTL_SECONDS))
+        if dedup is not None:
+            content = request_hash(*dedup)
+            steps.append((f"{scope}:content:{content}", content, DEDUP_WINDOW_SECONDS))
+        
+        replayed = False
+        
+        async def run_from(index: int) -> Dict:
+            nonlocal replayed
+            if index == len(steps):
+                return await handler()
+            record_id, fingerprint, ttl = steps[index]
+            response, hit = await self.run(record_id, fingerprint, ttl, lambda: run_from(index + 1))
+            replayed = replayed or hit
+            return response
+        
+        return await run_from(0), replayed
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,250 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Response, status
+from fastapi.responses import FileResponse
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+from pymongo import UpdateOne
+from database import get_collection, COLLECTIONS
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+
+# Uploads volume (mounted at /app/uploads in docker-compose) and the URL it is served under
+UPLOAD_DIR = Path(os.environ.get('UPLOAD_DIR', ROOT_DIR / 'uploads'))
+UPLOAD_URL_PREFIX = os.environ.get('UPLOAD_URL_PREFIX', '/api/uploads')
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(20 * 1024 * 1024)))
+# Internal nginx location aliasing UPLOAD_DIR, e.g. "/_uploads/"; when set, files are
+# sent by nginx through X-Accel-Redirect instead of being streamed by the workers
+UPLOAD_ACCEL_REDIRECT_PREFIX = os.environ.get('UPLOAD_ACCEL_REDIRECT_PREFIX')
+# Unreferenced blobs younger than this are kept: they may be about to be saved in a document
+BLOB_GC_GRACE_SECONDS = float(os.environ.get('BLOB_GC_GRACE_SECONDS', '86400'))
+
+# Blob URLs never change content, so they can be cached forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+BLOB_URL_PATTERN = re.compile(r"/blobs/[0-9a-f]{2}/([0-9a-f]{64})/")
+BLOB_FILE_NAME = re.compile(r"^[0-9]+\.[a-z0-9]+$")
+MANIFEST_NAME = "manifest.json"
+
+# Collections whose image and image_srcset fields reference blobs
+BLOB_REFERENCING_COLLECTIONS = ['gallery', 'services', 'blog_posts', 'news']
+
+# Derivative widths in pixels, never wider than the original
+IMAGE_WIDTHS = [int(width) for width in os.environ.get('IMAGE_WIDTHS', '320,640,960,1280,1920').split(',')]
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', '80'))
+AVIF_QUALITY = int(os.environ.get('AVIF_QUALITY', '60'))
+
+# Derivative formats by MIME type; AVIF only where Pillow was built with it
+IMAGE_FORMATS = {"image/webp": ("WEBP", "webp", {"quality": WEBP_QUALITY, "method": 4})}
+if features.check("avif"):
+    IMAGE_FORMATS["image/avif"] = ("AVIF", "avif", {"quality": AVIF_QUALITY})
+
+def make_derivatives(source: str, directory: str, widths: List[int]) -> Dict:
+    """Resize an uploaded image into every width and format; runs in a worker process"""
+    with Image.open(source) as image:
+        # Pillow only reads the header here; make sure the whole file decodes
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        
+        targets = sorted({width for width in widths if width < image.width} | {min(image.width, max(widths))})
+        files: Dict[str, List[Tuple[int, str]]] = {}
+        for width in targets:
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+            for mime_type, (pil_format, extension, options) in IMAGE_FORMATS.items():
+                name = f"{width}.{extension}"
+                resized.save(os.path.join(directory, name), pil_format, **options)
+                files.setdefault(mime_type, []).append((width, name))
+        return {"width": image.width, "height": image.height, "files": files}
+
+class ImageStore:
+    """Content-addressed store of uploaded images and their derivatives, keyed by the hash of the original"""
+    
+    def __init__(self, directory: Path = UPLOAD_DIR, workers: int = IMAGE_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first upload so that importing the app does not start processes; forking
+        # the threaded server process (Motor, password hashing pools) could deadlock the children
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._executor
+    
+    def blob_path(self, blob_id: str) -> Path:
+        return self.directory / "blobs" / blob_id[:2] / blob_id
+    
+    def url(self, blob_id: str, name: str) -> str:
+        return f"{UPLOAD_URL_PREFIX.rstrip('/')}/blobs/{blob_id[:2]}/{blob_id}/{name}"
+    
+    def describe(self, blob_id: str, manifest: Dict) -> Dict:
+        """Shape a blob as UploadedImage"""
+        srcset = {
+            mime_type: ", ".join(f"{self.url(blob_id, name)} {width}w" for width, name in files)
+            for mime_type, files in manifest["files"].items()
+        }
+        return {
+            "image": self.url(blob_id, manifest["files"]["image/webp"][-1][1]),
+            "image_srcset": srcset,
+            "width": manifest["width"],
+            "height": manifest["height"],
+        }
+    
+    async def save_stream(self, chunks: AsyncIterator[bytes]) -> Dict:
+        """Store a request body written chunk by chunk, rendering derivatives unless the same image exists"""
+        staging = self.directory / "staging" / str(uuid.uuid4())
+        staging.mkdir(parents=True)
+        source = staging / "original"
+        
+        try:
+            size = 0
+            digest = hashlib.sha256()
+            with open(source, "wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > UPLOAD_MAX_BYTES:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Image is larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB",
+                        )
+                    digest.update(chunk)
+                    file.write(chunk)
+            if size == 0:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty upload")
+            
+            blob_id = digest.hexdigest()
+            directory = self.blob_path(blob_id)
+            if directory.exists():
+                manifest = self._read_manifest(directory)
+            else:
+                manifest = await self._render(blob_id, source, staging)
+                directory.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.rename(staging, directory)
+                except OSError:
+                    # A concurrent upload of the same bytes got there first
+                    manifest = self._read_manifest(directory)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        
+        await self._register(blob_id, size, manifest)
+        return self.describe(blob_id, manifest)
+    
+    async def _render(self, blob_id: str, source: Path, staging: Path) -> Dict:
+        pool = self._pool()
+        try:
+            manifest = await asyncio.get_running_loop().run_in_executor(
+                pool, make_derivatives, str(source), str(staging), IMAGE_WIDTHS
+            )
+        except BrokenProcessPool:
+            # A worker died (killed for memory, say); the pool accepts no more work, so start a new one
+            logger.exception("Image worker pool broke while rendering %s", blob_id)
+            if self._executor is pool:
+                self._executor = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Image processing is unavailable, try again")
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as exc:
+            logger.info("Rejected upload %s: %s", blob_id, exc)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported or corrupt image")
+        # The original stays next to its derivatives so they can be rendered again
+        (staging / MANIFEST_NAME).write_text(json.dumps(manifest))
+        return manifest
+    
+    def _read_manifest(self, directory: Path) -> Dict:
+        return json.loads((directory / MANIFEST_NAME).read_text())
+    
+    async def _register(self, blob_id: str, size: int, manifest: Dict):
+        """Record a blob, restarting its grace period when it is uploaded again"""
+        registry = await get_collection(COLLECTIONS['blobs'])
+        now = datetime.utcnow()
+        await registry.update_one(
+            {"_id": blob_id},
+            {
+                "$set": {"uploaded_at": now},
+                "$setOnInsert": {"size": size, "width": manifest["width"], "height": manifest["height"],
+                                 "created_at": now, "refs": 0},
+            },
+            upsert=True
+        )
+    
+    def file_response(self, prefix: str, blob_id: str, name: str) -> Response:
+        """Serve a blob file with immutable caching, through nginx when X-Accel-Redirect is configured"""
+        if not re.fullmatch(r"[0-9a-f]{64}", blob_id) or prefix != blob_id[:2] or not BLOB_FILE_NAME.match(name):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if UPLOAD_ACCEL_REDIRECT_PREFIX:
+            headers["X-Accel-Redirect"] = f"{UPLOAD_ACCEL_REDIRECT_PREFIX.rstrip('/')}/blobs/{prefix}/{blob_id}/{name}"
+            return Response(headers=headers)
+        path = self.blob_path(blob_id) / name
+        if not path.is_file():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return FileResponse(path, headers=headers)
+    
+    async def count_references(self) -> Dict[str, int]:
+        """Count the documents referencing each blob"""
+        refs: Dict[str, int] = {}
+        for name in BLOB_REFERENCING_COLLECTIONS:
+            collection = await get_collection(COLLECTIONS[name])
+            async for doc in collection.find({}, {"image": 1, "image_srcset": 1}):
+                urls = [doc.get("image") or ""] + list((doc.get("image_srcset") or {}).values())
+                for blob_id in {blob_id for url in urls for blob_id in BLOB_URL_PATTERN.findall(url)}:
+                    refs[blob_id] = refs.get(blob_id, 0) + 1
+        return refs
+    
+    async def collect_garbage(self) -> Dict[str, int]:
+        """Recount references and delete blobs no document uses once their grace period is over"""
+        refs = await self.count_references()
+        registry = await get_collection(COLLECTIONS['blobs'])
+        cutoff = datetime.utcnow() - timedelta(seconds=BLOB_GC_GRACE_SECONDS)
+        
+        deleted, freed = 0, 0
+        updates = []
+        async for blob in registry.find({}, {"uploaded_at": 1, "size": 1, "refs": 1}):
+            count = refs.get(blob["_id"], 0)
+            if count == 0 and blob["uploaded_at"] < cutoff:
+                # Only if it was not uploaded again meanwhile
+                result = await registry.delete_one({"_id": blob["_id"], "uploaded_at": blob["uploaded_at"]})
+                if result.deleted_count:
+                    await asyncio.to_thread(shutil.rmtree, self.blob_path(blob["_id"]), True)
+                    deleted += 1
+                    freed += blob.get("size", 0)
+            elif blob.get("refs") != count:
+                updates.append(UpdateOne({"_id": blob["_id"]}, {"$set": {"refs": count}}))
+        if updates:
+            await registry.bulk_write(updates, ordered=False)
+        
+        # Leftovers of uploads interrupted by a restart
+        staging = self.directory / "staging"
+        if staging.is_dir():
+            for entry in staging.iterdir():
+                if entry.stat().st_mtime < time.time() - BLOB_GC_GRACE_SECONDS:
+                    await asyncio.to_thread(shutil.rmtree, entry, True)
+        
+        return {"referenced": len(refs), "deleted": deleted, "freed_bytes": freed}
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+image_store = ImageStore()
@@ -1,9 +1,12 @@
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 import uuid
 
+# Largest group accepted in one booking request
+MAX_PEOPLE_PER_BOOKING = 100
+
 # Enums
 class BookingStatus(str, Enum):
     NEW = "new"
@@ -15,6 +18,23 @@ class UserRole(str, Enum):
     ADMIN = "admin"
     MODERATOR = "moderator"
 
+class SearchType(str, Enum):
+    BLOG = "blog"
+    NEWS = "news"
+    SERVICES = "services"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+
+class BookingDateField(str, Enum):
+    CREATED_AT = "created_at"
+    PREFERRED_DATE = "preferred_date"
+
+class AnalyticsInterval(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+
 # Base model for MongoDB documents
 class MongoModel(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
@@ -55,9 +75,13 @@ class Service(MongoModel):
     description: str
     price: str
     image: str
+    # Uploaded image derivatives: MIME type -> srcset ("<url> <width>w, ...")
+    image_srcset: Optional[Dict[str, str]] = None
     content: Optional[str] = None
     duration: Optional[str] = None
     max_people: Optional[int] = None
+    # People that can be booked per day; no limit when unset
+    daily_capacity: Optional[int] = None
     is_active: bool = True
     order_index: int = 0
     seo_title: Optional[str] = None
@@ -70,9 +94,11 @@ class ServiceCreate(BaseModel):
     description: str
     price: str
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     content: Optional[str] = None
     duration: Optional[str] = None
     max_people: Optional[int] = None
+    daily_capacity: Optional[int] = None
     is_active: bool = True
     order_index: int = 0
 
@@ -83,9 +109,11 @@ class ServiceResponse(BaseModel):
     description: str
     price: str
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     content: Optional[str]
     duration: Optional[str]
     max_people: Optional[int]
+    daily_capacity: Optional[int] = None
     is_active: bool
 
 # Blog Post Model  
@@ -99,6 +127,7 @@ class BlogPost(MongoModel):
     is_published: bool = True
     tags: List[str] = Field(default_factory=list)
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     views: int = 0
     seo_title: Optional[str] = None
     seo_description: Optional[str] = None
@@ -112,6 +141,7 @@ class BlogPostCreate(BaseModel):
     author: str = "Команда ЛуЛу"
     tags: List[str] = Field(default_factory=list)
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     is_published: bool = True
 
 class BlogPostResponse(BaseModel):
@@ -124,8 +154,30 @@ class BlogPostResponse(BaseModel):
     publish_date: datetime
     tags: List[str]
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
+    views: int
+
+class BlogPostSummary(BaseModel):
+    """Blog post listing entry without the full content"""
+    id: str
+    title: str
+    slug: str
+    excerpt: str
+    author: str
+    publish_date: datetime
+    tags: List[str]
+    image: str
+    image_srcset: Optional[Dict[str, str]] = None
     views: int
 
+class BlogTagCount(BaseModel):
+    tag: str
+    count: int
+
+class BlogArchiveMonth(BaseModel):
+    month: str  # YYYY-MM
+    count: int
+
 # Review Model
 class Review(MongoModel):
     name: str
@@ -157,6 +209,7 @@ class News(MongoModel):
     excerpt: str
     content: str
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     publish_date: datetime = Field(default_factory=datetime.utcnow)
     is_published: bool = True
     author: str = "Администрация фермы"
@@ -166,6 +219,7 @@ class NewsCreate(BaseModel):
     excerpt: str
     content: str
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     is_published: bool = True
 
 class NewsResponse(BaseModel):
@@ -174,13 +228,38 @@ class NewsResponse(BaseModel):
     excerpt: str
     content: str
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
+    publish_date: datetime
+
+class NewsSummary(BaseModel):
+    """News listing entry without the full content"""
+    id: str
+    title: str
+    excerpt: str
+    image: str
+    image_srcset: Optional[Dict[str, str]] = None
     publish_date: datetime
 
+# Search Model
+class SearchHit(BaseModel):
+    """Search result pointing to a blog post, news item or service"""
+    type: SearchType
+    id: str
+    title: str
+    slug: Optional[str] = None
+    excerpt: Optional[str] = None
+    image: Optional[str] = None
+    image_srcset: Optional[Dict[str, str]] = None
+    publish_date: Optional[datetime] = None
+    # Text relevance; not set for prefix (autocomplete) matches
+    score: Optional[float] = None
+
 # Gallery Model
 class Gallery(MongoModel):
     title: Optional[str] = None
     description: Optional[str] = None
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     alt_text: str
     order_index: int = 0
     is_active: bool = True
@@ -189,6 +268,7 @@ class GalleryCreate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     alt_text: str
     order_index: int = 0
 
@@ -197,6 +277,7 @@ class GalleryResponse(BaseModel):
     title: Optional[str]
     description: Optional[str]
     image: str
+    image_srcset: Optional[Dict[str, str]] = None
     alt_text: str
 
 # Booking Model
@@ -210,6 +291,8 @@ class Booking(MongoModel):
     people_count: Optional[int] = None
     status: BookingStatus = BookingStatus.NEW
     admin_notes: Optional[str] = None
+    # Availability slot holding the places of this booking, if its service has a capacity
+    slot_id: Optional[str] = None
 
 class BookingCreate(BaseModel):
     name: str
@@ -218,7 +301,7 @@ class BookingCreate(BaseModel):
     message: Optional[str] = None
     service_id: Optional[str] = None
     preferred_date: Optional[datetime] = None
-    people_count: Optional[int] = None
+    people_count: Optional[int] = Field(None, ge=1, le=MAX_PEOPLE_PER_BOOKING)
 
 class BookingResponse(BaseModel):
     id: str
@@ -229,6 +312,65 @@ class BookingResponse(BaseModel):
     status: BookingStatus
     created_at: datetime
 
+class SlotAvailability(BaseModel):
+    date: str  # YYYY-MM-DD
+    capacity: Optional[int]
+    booked: int
+    available: Optional[int]
+
+# Booking analytics
+class ServiceBookingSeries(BaseModel):
+    service_id: Optional[str]
+    title: Optional[str]
+    bookings: List[int]  # per bucket
+    people: List[int]
+
+class BookingConversion(BaseModel):
+    service_id: Optional[str] = None
+    title: Optional[str] = None
+    total: int
+    by_status: Dict[str, int]
+    conversion_rate: float  # confirmed or completed out of all
+    cancellation_rate: float
+
+class PeopleCountDistribution(BaseModel):
+    service_id: Optional[str] = None
+    title: Optional[str] = None
+    bookings: int
+    counts: Dict[str, int]  # people_count -> bookings
+    mean: Optional[float]
+    median: Optional[int]
+    p90: Optional[int]
+
+class BookingAnalytics(BaseModel):
+    interval: AnalyticsInterval
+    date_field: BookingDateField
+    start: date
+    end: date
+    buckets: List[date]  # first day of each bucket
+    series: List[ServiceBookingSeries]
+    totals: List[int]
+    conversion: List[BookingConversion]
+    overall_conversion: BookingConversion
+    people: List[PeopleCountDistribution]
+    overall_people: PeopleCountDistribution
+
+# Image upload
+class UploadedImage(BaseModel):
+    image: str
+    image_srcset: Dict[str, str]
+    width: int
+    height: int
+
+# Homepage payload
+class BootstrapResponse(BaseModel):
+    site_info: SiteInfoResponse
+    services: List[ServiceResponse]
+    gallery: List[GalleryResponse]
+    reviews: List[ReviewResponse]
+    news: List[NewsSummary]
+    blog_posts: List[BlogPostSummary]
+
 # User Model (Admin)
 class User(MongoModel):
     username: str
@@ -275,6 +417,7 @@ class MenuResponse(BaseModel):
 class Statistics(BaseModel):
     total_bookings: int = 0
     pending_bookings: int = 0
+    bookings_by_status: Dict[str, int] = Field(default_factory=dict)
     total_reviews: int = 0
     pending_reviews: int = 0
     total_services: int = 0
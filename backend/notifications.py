@@ -0,0 +1,272 @@
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import PyMongoError
+from cache import serialize_json
+from database import get_collection, register_indexes, COLLECTIONS
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import uuid
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated sinks new bookings are delivered to: log, file, webhook, smtp
+NOTIFY_SINKS = os.environ.get('NOTIFY_SINKS', 'log')
+NOTIFY_POLL_INTERVAL_SECONDS = float(os.environ.get('NOTIFY_POLL_INTERVAL_SECONDS', '5'))
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '20'))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '8'))
+NOTIFY_BACKOFF_SECONDS = float(os.environ.get('NOTIFY_BACKOFF_SECONDS', '10'))
+NOTIFY_MAX_BACKOFF_SECONDS = float(os.environ.get('NOTIFY_MAX_BACKOFF_SECONDS', '3600'))
+# A claimed batch not finished within this time (e.g. the worker died) is picked up again
+NOTIFY_LEASE_SECONDS = float(os.environ.get('NOTIFY_LEASE_SECONDS', '120'))
+
+NOTIFY_FILE_PATH = os.environ.get('NOTIFY_FILE_PATH', 'notifications.jsonl')
+NOTIFY_WEBHOOK_URL = os.environ.get('NOTIFY_WEBHOOK_URL')
+NOTIFY_WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get('NOTIFY_WEBHOOK_TIMEOUT_SECONDS', '10'))
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
+SMTP_USER = os.environ.get('SMTP_USER')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'true').lower() == 'true'
+SMTP_FROM = os.environ.get('SMTP_FROM', 'noreply@alpaca-lulu.ru')
+NOTIFY_EMAIL_TO = os.environ.get('NOTIFY_EMAIL_TO', 'info@alpaca-lulu.ru')
+
+OUTBOX_PENDING = "pending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+# Booking fields included in notifications
+NOTIFICATION_FIELDS = ["name", "phone", "email", "message", "service_id", "preferred_date", "people_count", "created_at"]
+
+# Only undelivered bookings are indexed, so the dispatcher query stays small
+register_indexes(COLLECTIONS['bookings'], [
+    IndexModel([("outbox.next_attempt_at", ASCENDING)], name="outbox_pending",
+               partialFilterExpression={"outbox.state": OUTBOX_PENDING}),
+])
+
+def outbox_entry() -> Dict:
+    """Outbox state embedded in a new booking, so the event is written with the booking itself"""
+    return {
+        "state": OUTBOX_PENDING,
+        "attempts": 0,
+        "next_attempt_at": datetime.utcnow(),
+        "delivered": [],
+        "last_error": None,
+    }
+
+class LogSink:
+    """Writes notifications to the application log"""
+    
+    name = "log"
+    
+    async def send(self, bookings: List[Dict]):
+        for booking in bookings:
+            logger.info("New booking %s from %s (%s)", booking["id"], booking.get("name"), booking.get("phone"))
+
+class FileSink:
+    """Appends notifications as JSON lines to a file, a stand-in for real channels"""
+    
+    name = "file"
+    
+    def __init__(self, path: str = NOTIFY_FILE_PATH):
+        self.path = path
+    
+    def _write(self, bookings: List[Dict]):
+        with open(self.path, "ab") as file:
+            for booking in bookings:
+                file.write(serialize_json(booking) + b"\n")
+    
+    async def send(self, bookings: List[Dict]):
+        await asyncio.to_thread(self._write, bookings)
+
+class WebhookSink:
+    """Posts each batch as one JSON request"""
+    
+    name = "webhook"
+    
+    def __init__(self, url: str = NOTIFY_WEBHOOK_URL, timeout: float = NOTIFY_WEBHOOK_TIMEOUT_SECONDS):
+        if not url:
+            raise ValueError("NOTIFY_WEBHOOK_URL is required for the webhook sink")
+        self.url = url
+        self.timeout = timeout
+    
+    def _post(self, body: bytes):
+        response = requests.post(self.url, data=body, headers={"Content-Type": "application/json"},
+                                 timeout=self.timeout)
+        response.raise_for_status()
+    
+    async def send(self, bookings: List[Dict]):
+        await asyncio.to_thread(self._post, serialize_json({"event": "bookings.created", "bookings": bookings}))
+
+class SmtpSink:
+    """Emails staff one message per batch"""
+    
+    name = "smtp"
+    
+    def _message(self, bookings: List[Dict]) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = f"Новые заявки: {len(bookings)}"
+        message["From"] = SMTP_FROM
+        message["To"] = NOTIFY_EMAIL_TO
+        lines = []
+        for booking in bookings:
+            lines.append(f"{booking.get('name')} — {booking.get('phone')}")
+            for field in ("email", "service_id", "preferred_date", "people_count", "message"):
+                if booking.get(field):
+                    lines.append(f"  {field}: {booking[field]}")
+            lines.append("")
+        message.set_content("\n".join(lines))
+        return message
+    
+    def _send(self, message: EmailMessage):
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+            if SMTP_USER:
+                smtp.login(SMTP_USER, SMTP_PASSWORD)
+            smtp.send_message(message)
+    
+    async def send(self, bookings: List[Dict]):
+        await asyncio.to_thread(self._send, self._message(bookings))
+
+SINKS = {sink.name: sink for sink in (LogSink, FileSink, WebhookSink, SmtpSink)}
+
+def configured_sinks() -> List:
+    """Instantiate the sinks listed in NOTIFY_SINKS"""
+    return [SINKS[name.strip()]() for name in NOTIFY_SINKS.split(",") if name.strip()]
+
+class NotificationDispatcher:
+    """Delivers outbox events of new bookings to the sinks in batches, retrying with backoff"""
+    
+    def __init__(self, interval: float = NOTIFY_POLL_INTERVAL_SECONDS, batch_size: int = NOTIFY_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.worker_id = str(uuid.uuid4())
+        self.sinks: List = []
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def wake(self):
+        """Deliver soon instead of at the next poll"""
+        self._wake.set()
+    
+    async def claim_batch(self) -> List[Dict]:
+        """Lease due events to this worker, so other workers skip them"""
+        collection = await get_collection(COLLECTIONS['bookings'])
+        now = datetime.utcnow()
+        projection = {field: 1 for field in NOTIFICATION_FIELDS}
+        projection["outbox"] = 1
+        batch = []
+        while len(batch) < self.batch_size:
+            booking = await collection.find_one_and_update(
+                {"outbox.state": OUTBOX_PENDING, "outbox.next_attempt_at": {"$lte": now}},
+                {"$set": {"outbox.next_attempt_at": now + timedelta(seconds=NOTIFY_LEASE_SECONDS),
+                          "outbox.claimed_by": self.worker_id}},
+                projection=projection,
+                sort=[("outbox.next_attempt_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if booking is None:
+                break
+            batch.append(booking)
+        return batch
+    
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with jitter"""
+        delay = min(NOTIFY_BACKOFF_SECONDS * 2 ** (attempts - 1), NOTIFY_MAX_BACKOFF_SECONDS)
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def dispatch(self) -> int:
+        """Deliver one batch and record the outcome per booking; returns the batch size"""
+        batch = await self.claim_batch()
+        if not batch:
+            return 0
+        
+        errors: Dict[str, str] = {}
+        delivered: Dict[str, List[str]] = {
+            booking["_id"]: list(booking["outbox"].get("delivered", [])) for booking in batch
+        }
+        for sink in self.sinks:
+            # A retry skips the sinks that already got the booking
+            pending = [booking for booking in batch if sink.name not in delivered[booking["_id"]]]
+            if not pending:
+                continue
+            payload = [{"id": booking["_id"], **{field: booking.get(field) for field in NOTIFICATION_FIELDS}}
+                       for booking in pending]
+            try:
+                await sink.send(payload)
+            except Exception as exc:
+                logger.warning("Notification sink %s failed for %d bookings: %s", sink.name, len(pending), exc)
+                for booking in pending:
+                    errors[booking["_id"]] = f"{sink.name}: {exc}"
+                continue
+            for booking in pending:
+                delivered[booking["_id"]].append(sink.name)
+        
+        collection = await get_collection(COLLECTIONS['bookings'])
+        now = datetime.utcnow()
+        for booking in batch:
+            booking_id = booking["_id"]
+            if booking_id not in errors:
+                update = {"outbox.state": OUTBOX_SENT, "outbox.sent_at": now, "outbox.delivered": delivered[booking_id]}
+                self.sent += 1
+            else:
+                attempts = booking["outbox"].get("attempts", 0) + 1
+                update = {"outbox.attempts": attempts, "outbox.delivered": delivered[booking_id],
+                          "outbox.last_error": errors[booking_id]}
+                if attempts >= NOTIFY_MAX_ATTEMPTS:
+                    update["outbox.state"] = OUTBOX_FAILED
+                    self.failed += 1
+                else:
+                    update["outbox.next_attempt_at"] = now + timedelta(seconds=self.backoff(attempts))
+                    self.retried += 1
+            await collection.update_one({"_id": booking_id, "outbox.claimed_by": self.worker_id}, {"$set": update})
+        return len(batch)
+    
+    async def start(self):
+        """Start delivering in the background"""
+        if self._task is None:
+            self.sinks = configured_sinks()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop delivering; undelivered events stay in the outbox"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                # Keep going while full batches come back
+                while await self.dispatch() == self.batch_size:
+                    pass
+            except PyMongoError as exc:
+                logger.warning("Notification dispatch failed: %s", exc)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+    
+    def metrics(self) -> Dict:
+        return {
+            "sinks": [sink.name for sink in self.sinks],
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,180 @@
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import PyMongoError
+from database import get_collection, register_indexes, COLLECTIONS
+import ipaddress
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps buckets per worker; "mongo" shares them between workers and instances
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Comma-separated addresses or networks of the reverse proxies; only requests arriving from
+# them have the client address taken from X-Real-IP / X-Forwarded-For. Behind a proxy this
+# must be set, or every client shares the proxy's address and a single bucket per route.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.environ.get('TRUSTED_PROXIES', '').split(',') if proxy.strip()
+]
+RATE_LIMIT_MAX_BUCKETS = 10000
+
+# Default quota per route as "<requests>/<seconds>": a bucket of <requests> tokens
+# refilled over <seconds>. Override with e.g. RATE_LIMIT_LOGIN="10/60"; "off" disables.
+DEFAULT_RATE_LIMITS = {
+    "login": "5/60",
+    "bookings": "5/600",
+    "reviews": "3/600",
+}
+
+# Idle Mongo buckets are removed by the TTL monitor
+register_indexes(COLLECTIONS['rate_limits'], [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)])
+
+class Quota:
+    """Token bucket parameters: burst capacity and refill rate in tokens per second"""
+    
+    __slots__ = ("capacity", "rate")
+    
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+    
+    @classmethod
+    def parse(cls, value: str) -> Optional["Quota"]:
+        if value.strip().lower() in ("", "off", "0"):
+            return None
+        requests, _, seconds = value.partition("/")
+        return cls(int(requests), float(seconds or 1))
+    
+    def retry_after(self, tokens: float) -> int:
+        """Seconds until a bucket holding this many tokens has one whole token"""
+        # Rounded first so that float error does not push an exact 10 s wait up to 11 s
+        return max(1, math.ceil(round((1 - tokens) / self.rate, 6)))
+
+def route_quota(route: str) -> Optional[Quota]:
+    """Get the configured quota of a route, None when unlimited"""
+    env_name = "RATE_LIMIT_" + route.upper().replace("-", "_")
+    return Quota.parse(os.environ.get(env_name, DEFAULT_RATE_LIMITS.get(route, "off")))
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    """Address of the client, as seen by the reverse proxy when the request came through one"""
+    peer = request.client.host if request.client else None
+    if is_trusted_proxy(peer):
+        real_ip = request.headers.get("x-real-ip")
+        if real_ip:
+            return real_ip.strip()
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            # The last hop is the one added by our proxy; earlier ones are client supplied
+            return forwarded_for.split(",")[-1].strip()
+    return peer or "unknown"
+
+class MemoryBackend:
+    """Token buckets of this worker only"""
+    
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+    
+    async def hit(self, key: str, quota: Quota) -> Tuple[bool, int]:
+        """Take a token from the bucket, returning whether allowed and the seconds to wait if not"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (quota.capacity, now))
+        tokens = min(quota.capacity, tokens + (now - updated) * quota.rate)
+        
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        if key not in self._buckets and len(self._buckets) >= self.max_buckets:
+            self._buckets.clear()
+        self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else quota.retry_after(tokens)
+
+class MongoBackend:
+    """Token buckets shared through MongoDB, each refilled and taken from in one atomic update"""
+    
+    async def hit(self, key: str, quota: Quota) -> Tuple[bool, int]:
+        collection = await get_collection(COLLECTIONS['rate_limits'])
+        elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [
+            quota.capacity,
+            {"$add": [{"$ifNull": ["$tokens", quota.capacity]}, {"$multiply": [elapsed_seconds, quota.rate]}]},
+        ]}
+        full_after_ms = int(1000 * quota.capacity / quota.rate)
+        try:
+            bucket = await collection.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                    {"$set": {
+                        "allowed": {"$gte": ["$tokens", 1]},
+                        "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                        # An idle bucket is full again by then and can simply be dropped
+                        "expires_at": {"$add": ["$$NOW", full_after_ms]},
+                    }},
+                ],
+                projection={"tokens": 1, "allowed": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except PyMongoError as exc:
+            # Fail open: losing throttling briefly beats rejecting every visitor
+            logger.warning("Rate limit check failed for %s: %s", key, exc)
+            return True, 0
+        return bucket["allowed"], 0 if bucket["allowed"] else quota.retry_after(bucket["tokens"])
+
+class RateLimiter:
+    """Applies per-route quotas per client IP"""
+    
+    def __init__(self, backend_name: str = RATE_LIMIT_BACKEND):
+        self.backend = MongoBackend() if backend_name == "mongo" else MemoryBackend()
+        self.backend_name = backend_name
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+    
+    async def check(self, route: str, quota: Quota, request: Request):
+        """Count a request against the quota, raising 429 when it is exhausted"""
+        allowed, retry_after = await self.backend.hit(f"{route}:{client_ip(request)}", quota)
+        counters = self.allowed if allowed else self.limited
+        counters[route] = counters.get(route, 0) + 1
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+    
+    def check_configuration(self):
+        """Warn when quotas are enforced without knowing which peers are proxies"""
+        limited = [route for route in DEFAULT_RATE_LIMITS if route_quota(route) is not None]
+        if limited and not TRUSTED_PROXIES:
+            logger.warning(
+                "Rate limits are active for %s but TRUSTED_PROXIES is not set: clients are told apart by "
+                "the connecting address, so behind a reverse proxy they all share one bucket",
+                ", ".join(limited)
+            )
+    
+    def metrics(self) -> Dict:
+        return {"backend": self.backend_name, "allowed": dict(self.allowed), "limited": dict(self.limited)}
+
+rate_limiter = RateLimiter()
+
+def rate_limit(route: str):
+    """Dependency enforcing the quota of a route per client IP"""
+    quota = route_quota(route)
+    
+    async def dependency(request: Request):
+        if quota is not None:
+            await rate_limiter.check(route, quota, request)
+    
+    return dependency
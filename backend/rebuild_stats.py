@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the materialized dashboard counters and availability slots, report drift,
+fill fields documents were stored without and delete uploaded images no document references
+"""
+
+import asyncio
+from pathlib import Path
+from dotenv import load_dotenv
+
+from database import connect_to_mongo, close_mongo_connection
+from services import (
+    stats_service, availability_service, services_service, blog_service, news_service, reviews_service,
+    gallery_service
+)
+from images import image_store
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+async def rebuild_stats():
+    """Recount the stats document from the collections"""
+    print("🔢 Rebuilding dashboard statistics...")
+    
+    await connect_to_mongo()
+    
+    try:
+        drift = await stats_service.rebuild_counters()
+        if drift:
+            print("⚠️ Counter drift corrected:")
+            for key, delta in sorted(drift.items()):
+                print(f"   {key}: {delta:+d}")
+        else:
+            print("✅ Counters were already consistent")
+        
+        corrected = await availability_service.rebuild()
+        if corrected:
+            print(f"⚠️ Availability corrected in {corrected} slots")
+        else:
+            print("✅ Availability was already consistent")
+        
+        for service in (services_service, blog_service, news_service, reviews_service, gallery_service):
+            backfilled = await service.backfill_defaults()
+            if backfilled:
+                print(f"⚠️ Missing fields filled in {service.collection_name}: {backfilled} updates")
+        
+        garbage = await image_store.collect_garbage()
+        print(f"🖼️ Images referenced: {garbage['referenced']}, "
+              f"orphans deleted: {garbage['deleted']} ({garbage['freed_bytes']} bytes)")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_stats())
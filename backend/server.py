@@ -1,20 +1,36 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import logging
 from pathlib import Path
-from typing import List
-from datetime import datetime, timedelta
+from typing import List, Optional, Union
+from datetime import date, datetime, timedelta
 
 # Import our modules
 from models import *
-from database import connect_to_mongo, close_mongo_connection
-from auth import authenticate_user, create_access_token, get_current_admin_user, create_default_admin
+from database import (
+    connect_to_mongo, close_mongo_connection, ensure_indexes, index_report, pool_metrics, COLLECTIONS
+)
+from cache import response_cache, cache_invalidator, CachedResponse
+from http_cache import conditional_response
+from images import image_store, UPLOAD_URL_PREFIX
+from analytics import booking_analytics_service
+from exports import export_row, xlsx_available, BOOKING_EXPORT_COLUMNS, CONTENT_TYPES, EXPORT_WRITERS
+from notifications import notification_dispatcher
+from ratelimit import rate_limit, rate_limiter
+from idempotency import idempotency_store, normalize_phone, IDEMPOTENCY_KEY_MAX_LENGTH, REPLAYED_HEADER
+from auth import (
+    authenticate_user, create_access_token, get_current_admin_user, create_default_admin,
+    password_hasher
+)
 from services import (
     site_info_service, services_service, blog_service, reviews_service,
-    news_service, gallery_service, booking_service, stats_service
+    news_service, gallery_service, booking_service, availability_service, stats_service, search_service,
+    blog_view_counter, BookingRejectedError, InvalidQueryError
 )
 
 ROOT_DIR = Path(__file__).parent
@@ -33,6 +49,28 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer()
 
+# Pagination
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 100
+ADMIN_BOOKINGS_PAGE_SIZE = 50
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """Expose the cursor of the next page, if any, in a response header"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+# Items of each list in the homepage bootstrap payload
+BOOTSTRAP_REVIEWS = 5
+BOOTSTRAP_NEWS = 3
+BOOTSTRAP_BLOG_POSTS = 3
+
+# Availability ranges: default length and the longest one answered, in days
+AVAILABILITY_DEFAULT_DAYS = 30
+AVAILABILITY_MAX_DAYS = 92
+
+def next_cursor_headers(next_cursor: Optional[str]) -> dict:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
 # ================================
 # PUBLIC ENDPOINTS
 # ================================
@@ -41,77 +79,226 @@ security = HTTPBearer()
 async def root():
     return {"message": "Alpaca Farm LL API", "version": "1.0.0"}
 
+# Homepage
+@api_router.get("/bootstrap", response_model=BootstrapResponse)
+async def get_bootstrap(request: Request):
+    """Get everything the homepage renders in one payload"""
+    async def load():
+        site_info, services, gallery, (reviews, _), (news, _), (posts, _) = await asyncio.gather(
+            site_info_service.get_site_info(),
+            services_service.get_active_services(),
+            gallery_service.get_active_images(),
+            reviews_service.get_approved_reviews(limit=BOOTSTRAP_REVIEWS),
+            news_service.get_published_news(limit=BOOTSTRAP_NEWS, summary=True),
+            blog_service.get_published_posts(limit=BOOTSTRAP_BLOG_POSTS, summary=True),
+        )
+        return CachedResponse.from_content({
+            "site_info": site_info,
+            "services": services,
+            "gallery": gallery,
+            "reviews": reviews,
+            "news": news,
+            "blog_posts": posts,
+        })
+    
+    tags = [COLLECTIONS[name] for name in ('site_info', 'services', 'gallery', 'reviews', 'news', 'blog_posts')]
+    cached = await response_cache.get_or_load("bootstrap", load, tags=tags)
+    return conditional_response(request, cached, "bootstrap")
+
 # Site Information
 @api_router.get("/site-info", response_model=SiteInfoResponse)
-async def get_site_info():
+async def get_site_info(request: Request):
     """Get site information"""
-    return await site_info_service.get_site_info()
+    async def load():
+        return CachedResponse.from_content(await site_info_service.get_site_info())
+    
+    cached = await response_cache.get_or_load("site-info", load, tags=[COLLECTIONS['site_info']])
+    return conditional_response(request, cached, "site-info")
 
 # Services
 @api_router.get("/services", response_model=List[ServiceResponse])
-async def get_services():
+async def get_services(request: Request):
     """Get all active services"""
-    return await services_service.get_active_services()
+    async def load():
+        return CachedResponse.from_content(await services_service.get_active_services())
+    
+    cached = await response_cache.get_or_load("services", load, tags=[COLLECTIONS['services']])
+    return conditional_response(request, cached, "services")
 
 @api_router.get("/services/{slug}", response_model=ServiceResponse)
-async def get_service_by_slug(slug: str):
+async def get_service_by_slug(request: Request, slug: str):
     """Get service by slug"""
     service = await services_service.get_service_by_slug(slug)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    return service
+    return conditional_response(request, CachedResponse.from_content(service), "service")
+
+@api_router.get("/services/{slug}/availability", response_model=List[SlotAvailability])
+async def get_service_availability(
+    request: Request,
+    slug: str,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to")
+):
+    """Get places left per day for a service, from the precomputed slots"""
+    start = start or date.today()
+    end = end or start + timedelta(days=AVAILABILITY_DEFAULT_DAYS - 1)
+    if end < start or (end - start).days >= AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must span 1 to {AVAILABILITY_MAX_DAYS} days")
+    
+    service = await services_service.get_service_by_slug(slug)
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
+    days = await availability_service.get_availability(service.id, service.daily_capacity, start, end)
+    return conditional_response(request, CachedResponse.from_content(days), "availability")
 
 # Blog
-@api_router.get("/blog/posts", response_model=List[BlogPostResponse])
-async def get_blog_posts(limit: int = 10, skip: int = 0):
-    """Get published blog posts"""
-    return await blog_service.get_published_posts(limit=limit, skip=skip)
+@api_router.get("/blog/posts", response_model=Union[List[BlogPostResponse], List[BlogPostSummary]])
+async def get_blog_posts(
+    request: Request,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    tag: Optional[str] = None,
+    month: Optional[str] = Query(None, description="YYYY-MM")
+):
+    """Get published blog posts, optionally by tag or month, without content when summary is set"""
+    posts, next_cursor = await blog_service.get_published_posts(
+        limit=limit, skip=skip, cursor=cursor, summary=summary, tag=tag, month=month
+    )
+    cached = CachedResponse.from_content(posts, next_cursor_headers(next_cursor))
+    return conditional_response(request, cached, "blog-posts")
+
+@api_router.get("/blog/tags", response_model=List[BlogTagCount])
+async def get_blog_tags(request: Request):
+    """Get published post counts per tag, most used first"""
+    async def load():
+        return CachedResponse.from_content((await blog_service.get_facets())["tags"])
+    
+    cached = await response_cache.get_or_load("blog-tags", load, tags=[COLLECTIONS['blog_posts']])
+    return conditional_response(request, cached, "blog-facets")
+
+@api_router.get("/blog/archive", response_model=List[BlogArchiveMonth])
+async def get_blog_archive(request: Request):
+    """Get published post counts per month, latest first"""
+    async def load():
+        return CachedResponse.from_content((await blog_service.get_facets())["months"])
+    
+    cached = await response_cache.get_or_load("blog-archive", load, tags=[COLLECTIONS['blog_posts']])
+    return conditional_response(request, cached, "blog-facets")
 
 @api_router.get("/blog/posts/{slug}", response_model=BlogPostResponse)
-async def get_blog_post(slug: str):
+async def get_blog_post(request: Request, slug: str):
     """Get blog post by slug"""
     post = await blog_service.get_post_by_slug(slug)
     if not post:
         raise HTTPException(status_code=404, detail="Blog post not found")
-    return post
+    # The view count changes on every read, so it is left out of the ETag
+    cached = CachedResponse.from_content(post, validator_content=post.model_dump(exclude={"views"}))
+    return conditional_response(request, cached, "blog-post")
 
 # Reviews
 @api_router.get("/reviews", response_model=List[ReviewResponse])
-async def get_reviews(limit: int = 20):
+async def get_reviews(request: Request, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                      cursor: Optional[str] = None):
     """Get approved reviews"""
-    return await reviews_service.get_approved_reviews(limit=limit)
-
-@api_router.post("/reviews")
-async def create_review(review: ReviewCreate):
+    reviews, next_cursor = await reviews_service.get_approved_reviews(limit=limit, cursor=cursor)
+    cached = CachedResponse.from_content(reviews, next_cursor_headers(next_cursor))
+    return conditional_response(request, cached, "reviews")
+
+@api_router.post("/reviews", dependencies=[Depends(rate_limit("reviews"))])
+async def create_review(
+    review: ReviewCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX_LENGTH)
+):
     """Create new review (requires approval)"""
-    review_dict = review.dict()
-    review_id = await reviews_service.create(review_dict)
-    return {"message": "Отзыв отправлен на модерацию", "id": review_id}
+    async def create():
+        review_id = await reviews_service.create(review.dict())
+        return {"message": "Отзыв отправлен на модерацию", "id": review_id}
+    
+    result, replayed = await idempotency_store.submit(
+        "reviews", review, create, idempotency_key=idempotency_key,
+        dedup=(review.name.strip().lower(), review.text.strip())
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
 
 # News
-@api_router.get("/news", response_model=List[NewsResponse])
-async def get_news(limit: int = 10):
-    """Get published news"""
-    return await news_service.get_published_news(limit=limit)
+@api_router.get("/news", response_model=Union[List[NewsResponse], List[NewsSummary]])
+async def get_news(request: Request, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+                   cursor: Optional[str] = None, summary: bool = False):
+    """Get published news, without content when summary is set"""
+    async def load():
+        news, next_cursor = await news_service.get_published_news(limit=limit, cursor=cursor, summary=summary)
+        return CachedResponse.from_content(news, next_cursor_headers(next_cursor))
+    
+    # Only the first pages are hot enough to be worth caching
+    if cursor:
+        cached = await load()
+    else:
+        cached = await response_cache.get_or_load(("news", limit, summary), load, tags=[COLLECTIONS['news']])
+    return conditional_response(request, cached, "news")
 
 # Gallery
 @api_router.get("/gallery", response_model=List[GalleryResponse])
-async def get_gallery():
+async def get_gallery(request: Request):
     """Get gallery images"""
-    return await gallery_service.get_active_images()
+    async def load():
+        return CachedResponse.from_content(await gallery_service.get_active_images())
+    
+    cached = await response_cache.get_or_load("gallery", load, tags=[COLLECTIONS['gallery']])
+    return conditional_response(request, cached, "gallery")
+
+# Search
+@api_router.get("/search", response_model=List[SearchHit])
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=100),
+    types: Optional[str] = None,
+    prefix: bool = False,
+    limit: int = Query(10, ge=1, le=50),
+    skip: int = Query(0, ge=0, le=200)
+):
+    """Search published blog posts, news and active services; prefix matches titles for autocomplete"""
+    try:
+        search_types = [SearchType(name.strip()) for name in types.split(",")] if types else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid search type")
+    
+    hits = await search_service.search(q.strip(), types=search_types, limit=limit, skip=skip, prefix=prefix)
+    return conditional_response(request, CachedResponse.from_content(hits), "search")
 
 # Bookings
-@api_router.post("/bookings")
-async def create_booking(booking: BookingCreate):
+@api_router.post("/bookings", dependencies=[Depends(rate_limit("bookings"))])
+async def create_booking(
+    booking: BookingCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX_LENGTH)
+):
     """Create new booking"""
-    booking_id = await booking_service.create_booking(booking)
-    return {"message": "Заявка успешно отправлена! Мы свяжемся с вами в ближайшее время.", "id": booking_id}
+    async def create():
+        booking_id = await booking_service.create_booking(booking)
+        return {"message": "Заявка успешно отправлена! Мы свяжемся с вами в ближайшее время.", "id": booking_id}
+    
+    dedup = (normalize_phone(booking.phone), booking.service_id, booking.preferred_date)
+    if not booking.service_id and booking.preferred_date is None:
+        # A general enquiry names no slot, so only the same message from the same phone is a resubmission
+        dedup += (booking.message,)
+    result, replayed = await idempotency_store.submit(
+        "bookings", booking, create, idempotency_key=idempotency_key, dedup=dedup
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
 
 # ================================
 # AUTH ENDPOINTS
 # ================================
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limit("login"))])
 async def login(user_credentials: UserLogin):
     """Admin login"""
     user = await authenticate_user(user_credentials.username, user_credentials.password)
@@ -123,7 +310,7 @@ async def login(user_credentials: UserLogin):
     
     access_token_expires = timedelta(minutes=1440)  # 24 hours
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "role": user.role.value}, expires_delta=access_token_expires
     )
     
     return {
@@ -154,16 +341,80 @@ async def get_dashboard_stats(current_user: UserResponse = Depends(get_current_a
     """Get dashboard statistics"""
     return await stats_service.get_dashboard_stats()
 
+@api_router.get("/admin/analytics/bookings", response_model=BookingAnalytics)
+async def get_booking_analytics(
+    request: Request,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    interval: AnalyticsInterval = AnalyticsInterval.DAY,
+    date_field: BookingDateField = BookingDateField.CREATED_AT,
+    current_user: UserResponse = Depends(get_current_admin_user)
+):
+    """Get bookings per day or week and service, conversion and party sizes, cached per window"""
+    start, end = booking_analytics_service.window(start, end)
+    
+    async def load():
+        return CachedResponse.from_content(
+            await booking_analytics_service.get_booking_analytics(start, end, interval, date_field)
+        )
+    
+    key = ("booking-analytics", start, end, interval, date_field)
+    cached = await response_cache.get_or_load(key, load, tags=[COLLECTIONS['bookings'], COLLECTIONS['services']])
+    return conditional_response(request, cached, "booking-analytics")
+
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: UserResponse = Depends(get_current_admin_user)):
+    """Get runtime metrics of this worker"""
+    return {
+        "password_hashing": password_hasher.metrics(),
+        "response_cache": response_cache.metrics(),
+        "mongo_pool": pool_metrics.metrics(),
+        "rate_limit": rate_limiter.metrics(),
+        "notifications": notification_dispatcher.metrics(),
+    }
+
+@api_router.get("/admin/indexes")
+async def get_index_report(current_user: UserResponse = Depends(get_current_admin_user)):
+    """Get missing, unused and undeclared indexes per collection"""
+    return await index_report()
+
+@api_router.post("/admin/stats/rebuild")
+async def rebuild_dashboard_stats(current_user: UserResponse = Depends(get_current_admin_user)):
+    """Recount dashboard statistics and report counter drift"""
+    drift = await stats_service.rebuild_counters()
+    return {"message": "Статистика пересчитана", "drift": drift}
+
+@api_router.post("/admin/availability/rebuild")
+async def rebuild_availability(current_user: UserResponse = Depends(get_current_admin_user)):
+    """Recount booked places per slot from the bookings"""
+    corrected = await availability_service.rebuild()
+    return {"message": "Занятость пересчитана", "corrected_slots": corrected}
+
+# Admin Uploads
+@api_router.post("/admin/uploads", response_model=UploadedImage)
+async def upload_image(request: Request, current_user: UserResponse = Depends(get_current_admin_user)):
+    """Upload an image as the raw request body and get the URLs of its resized derivatives"""
+    content_type = request.headers.get("content-type", "")
+    if content_type and not content_type.startswith(("image/", "application/octet-stream")):
+        raise HTTPException(status_code=415, detail="Expected an image")
+    return await image_store.save_stream(request.stream())
+
+@api_router.post("/admin/uploads/gc")
+async def collect_upload_garbage(current_user: UserResponse = Depends(get_current_admin_user)):
+    """Recount image references and delete uploads no document uses"""
+    return await image_store.collect_garbage()
+
 # Admin Services Management
 @api_router.get("/admin/services", response_model=List[ServiceResponse])
 async def get_admin_services(current_user: UserResponse = Depends(get_current_admin_user)):
     """Get all services for admin"""
-    return await services_service.get_all()
+    return await services_service.get_all(primary=True)
 
 @api_router.post("/admin/services")
 async def create_service(service: ServiceCreate, current_user: UserResponse = Depends(get_current_admin_user)):
     """Create new service"""
     service_id = await services_service.create(service.dict())
+    response_cache.invalidate(COLLECTIONS['services'])
     return {"message": "Услуга создана", "id": service_id}
 
 @api_router.put("/admin/services/{service_id}")
@@ -174,6 +425,7 @@ async def update_service(
 ):
     """Update service"""
     success = await services_service.update(service_id, service.dict())
+    response_cache.invalidate(COLLECTIONS['services'])
     if not success:
         raise HTTPException(status_code=404, detail="Service not found")
     return {"message": "Услуга обновлена"}
@@ -182,6 +434,7 @@ async def update_service(
 async def delete_service(service_id: str, current_user: UserResponse = Depends(get_current_admin_user)):
     """Delete service"""
     success = await services_service.delete(service_id)
+    response_cache.invalidate(COLLECTIONS['services'])
     if not success:
         raise HTTPException(status_code=404, detail="Service not found")
     return {"message": "Услуга удалена"}
@@ -190,12 +443,13 @@ async def delete_service(service_id: str, current_user: UserResponse = Depends(g
 @api_router.get("/admin/blog/posts", response_model=List[BlogPostResponse])
 async def get_admin_blog_posts(current_user: UserResponse = Depends(get_current_admin_user)):
     """Get all blog posts for admin"""
-    return await blog_service.get_all()
+    return await blog_service.get_all(primary=True)
 
 @api_router.post("/admin/blog/posts")
 async def create_blog_post(post: BlogPostCreate, current_user: UserResponse = Depends(get_current_admin_user)):
     """Create new blog post"""
     post_id = await blog_service.create(post.dict())
+    response_cache.invalidate(COLLECTIONS['blog_posts'])
     return {"message": "Статья создана", "id": post_id}
 
 @api_router.put("/admin/blog/posts/{post_id}")
@@ -206,6 +460,7 @@ async def update_blog_post(
 ):
     """Update blog post"""
     success = await blog_service.update(post_id, post.dict())
+    response_cache.invalidate(COLLECTIONS['blog_posts'])
     if not success:
         raise HTTPException(status_code=404, detail="Post not found")
     return {"message": "Статья обновлена"}
@@ -214,6 +469,7 @@ async def update_blog_post(
 async def delete_blog_post(post_id: str, current_user: UserResponse = Depends(get_current_admin_user)):
     """Delete blog post"""
     success = await blog_service.delete(post_id)
+    response_cache.invalidate(COLLECTIONS['blog_posts'])
     if not success:
         raise HTTPException(status_code=404, detail="Post not found")
     return {"message": "Статья удалена"}
@@ -228,6 +484,7 @@ async def get_pending_reviews(current_user: UserResponse = Depends(get_current_a
 async def approve_review(review_id: str, current_user: UserResponse = Depends(get_current_admin_user)):
     """Approve review"""
     success = await reviews_service.update(review_id, {"is_approved": True})
+    response_cache.invalidate(COLLECTIONS['reviews'])
     if not success:
         raise HTTPException(status_code=404, detail="Review not found")
     return {"message": "Отзыв одобрен"}
@@ -236,15 +493,53 @@ async def approve_review(review_id: str, current_user: UserResponse = Depends(ge
 async def delete_review(review_id: str, current_user: UserResponse = Depends(get_current_admin_user)):
     """Delete review"""
     success = await reviews_service.delete(review_id)
+    response_cache.invalidate(COLLECTIONS['reviews'])
     if not success:
         raise HTTPException(status_code=404, detail="Review not found")
     return {"message": "Отзыв удален"}
 
 # Admin Bookings Management  
 @api_router.get("/admin/bookings", response_model=List[BookingResponse])
-async def get_all_bookings(current_user: UserResponse = Depends(get_current_admin_user)):
-    """Get all bookings"""
-    return await booking_service.get_bookings_by_status()
+async def get_all_bookings(
+    response: Response,
+    status: Optional[BookingStatus] = None,
+    limit: int = Query(ADMIN_BOOKINGS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_admin_user)
+):
+    """Get a page of bookings, newest first, optionally with one status"""
+    bookings, next_cursor = await booking_service.get_bookings_page(status=status, limit=limit, cursor=cursor)
+    set_next_cursor(response, next_cursor)
+    return bookings
+
+@api_router.get("/admin/bookings/export")
+async def export_bookings(
+    format: ExportFormat = ExportFormat.CSV,
+    status: Optional[BookingStatus] = None,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    date_field: BookingDateField = BookingDateField.CREATED_AT,
+    current_user: UserResponse = Depends(get_current_admin_user)
+):
+    """Download bookings as CSV or XLSX, streamed from the database cursor"""
+    if format == ExportFormat.XLSX and not xlsx_available():
+        raise HTTPException(status_code=400, detail="XLSX export is not available, use CSV")
+    query = booking_service.export_query(status, start, end, date_field)
+    services = await services_service.get_all(projection={"title": 1})
+    service_titles = {service["_id"]: service["title"] for service in services}
+    
+    fields = [field for _, field in BOOKING_EXPORT_COLUMNS]
+    chunks = EXPORT_WRITERS[format.value](
+        booking_service.iter_export(query, fields),
+        BOOKING_EXPORT_COLUMNS,
+        lambda booking: export_row(booking, BOOKING_EXPORT_COLUMNS, service_titles)
+    )
+    filename = f"bookings-{datetime.utcnow():%Y%m%d-%H%M}.{format.value}"
+    return StreamingResponse(
+        chunks,
+        media_type=CONTENT_TYPES[format.value],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
 
 @api_router.put("/admin/bookings/{booking_id}/status")
 async def update_booking_status(
@@ -264,6 +559,7 @@ async def update_booking_status(
 async def create_news(news: NewsCreate, current_user: UserResponse = Depends(get_current_admin_user)):
     """Create news"""
     news_id = await news_service.create(news.dict())
+    response_cache.invalidate(COLLECTIONS['news'])
     return {"message": "Новость создана", "id": news_id}
 
 @api_router.put("/admin/news/{news_id}")
@@ -274,6 +570,7 @@ async def update_news(
 ):
     """Update news"""
     success = await news_service.update(news_id, news.dict())
+    response_cache.invalidate(COLLECTIONS['news'])
     if not success:
         raise HTTPException(status_code=404, detail="News not found")
     return {"message": "Новость обновлена"}
@@ -282,6 +579,7 @@ async def update_news(
 async def delete_news(news_id: str, current_user: UserResponse = Depends(get_current_admin_user)):
     """Delete news"""
     success = await news_service.delete(news_id)
+    response_cache.invalidate(COLLECTIONS['news'])
     if not success:
         raise HTTPException(status_code=404, detail="News not found")
     return {"message": "Новость удалена"}
@@ -289,12 +587,27 @@ async def delete_news(news_id: str, current_user: UserResponse = Depends(get_cur
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.exception_handler(BookingRejectedError)
+async def booking_rejected_handler(request: Request, exc: BookingRejectedError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(InvalidQueryError)
+async def invalid_query_handler(request: Request, exc: InvalidQueryError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# Uploaded images; the bytes are sent by nginx when X-Accel-Redirect is configured
+@app.get(UPLOAD_URL_PREFIX.rstrip("/") + "/blobs/{prefix}/{blob_id}/{name}")
+async def get_upload(prefix: str, blob_id: str, name: str):
+    """Serve a file of an uploaded image"""
+    return image_store.file_response(prefix, blob_id, name)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER, "ETag", "Last-Modified"],
 )
 
 # Configure logging
@@ -308,10 +621,19 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    await ensure_indexes()
     await create_default_admin()
+    rate_limiter.check_configuration()
+    await cache_invalidator.start()
+    await blog_view_counter.start()
+    await notification_dispatcher.start()
     logger.info("Application started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await notification_dispatcher.stop()
+    await blog_view_counter.stop()
+    await cache_invalidator.stop()
+    image_store.close()
     await close_mongo_connection()
     logger.info("Application shut down successfully")
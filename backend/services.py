@@ -1,29 +1,198 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Dict, Any, Tuple, Type
+from datetime import date, datetime, timedelta
+from enum import Enum
 from models import *
-from database import get_collection, COLLECTIONS
+from database import get_collection, read_preference_from_name, register_indexes, COLLECTIONS
+from cache import cache_invalidator
+from notifications import notification_dispatcher, outbox_entry
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+import asyncio
+import base64
+import json
+import logging
+import os
+import re
 import uuid
 
+logger = logging.getLogger(__name__)
+
+# Interval between flushes of buffered blog post views
+VIEW_FLUSH_INTERVAL_SECONDS = float(os.environ.get('VIEW_FLUSH_INTERVAL_SECONDS', '10'))
+
+# Read preference of the public catalog reads, e.g. "secondaryPreferred" to use replicas
+CATALOG_READ_PREFERENCE = os.environ.get('CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+
+# Language of the text indexes, used for stemming and stop words
+SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE', 'russian')
+
+# People bookable per day for services without daily_capacity; unset means no limit
+DEFAULT_DAILY_CAPACITY = os.environ.get('DEFAULT_DAILY_CAPACITY')
+# Status changes re-read the booking this many times when another change wins the race
+STATUS_UPDATE_ATTEMPTS = 5
+
+# Sort specification: list of (field, direction) pairs, as accepted by pymongo
+SortSpec = List[Tuple[str, int]]
+
+class InvalidQueryError(ValueError):
+    """Raised when a list query parameter is malformed"""
+
+class InvalidCursorError(InvalidQueryError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+class BookingRejectedError(ValueError):
+    """Raised when a booking does not fit its service or the places left on its date"""
+
+# Lean read path: fetch only the response fields and skip Pydantic validation
+def projection_for(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection fetching only the fields of a response model"""
+    return {("_id" if name == "id" else name): 1 for name in model.model_fields}
+
+# Marks a response field neither the document nor the defaults provide
+MISSING = object()
+
+def shape_documents(docs: List[Dict], model: Type[BaseModel], defaults: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Shape stored documents like a response model without validating them again.
+    
+    Fields a document was stored without take their value from defaults; a document still missing
+    a field is validated, which raises rather than serve a payload the schema rejects.
+    """
+    fields = [(name, "_id" if name == "id" else name) for name in model.model_fields]
+    defaults = defaults or {}
+    shaped = []
+    for doc in docs:
+        item = {name: doc[key] if key in doc else defaults.get(name, MISSING) for name, key in fields}
+        if any(value is MISSING for value in item.values()):
+            item = model.model_validate({name: value for name, value in item.items() if value is not MISSING}).model_dump()
+        shaped.append(item)
+    return shaped
+
+def document_defaults(model: Type[BaseModel], exclude: Iterable[str] = ()) -> Dict[str, Any]:
+    """Default values of a stored document model, except the id and timestamps create sets"""
+    skipped = set(MongoModel.model_fields) | set(exclude)
+    return {
+        name: info.get_default(call_default_factory=True)
+        for name, info in model.model_fields.items() if not info.is_required() and name not in skipped
+    }
+
+def month_range(month: str) -> Tuple[datetime, datetime]:
+    """Start and end of a "YYYY-MM" month"""
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise InvalidQueryError("Invalid month, expected YYYY-MM")
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+def text_index(visibility_field: str, weights: Dict[str, int]) -> IndexModel:
+    """Text index over the weighted fields, prefixed by the visibility flag every search filters on"""
+    keys = [(visibility_field, ASCENDING)] + [(field, TEXT) for field in weights]
+    return IndexModel(keys, weights=weights, default_language=SEARCH_LANGUAGE, name=f"{visibility_field}_search")
+
+# Materialized dashboard counters
+STATS_DOCUMENT_ID = "dashboard"
+# Materialized blog tag and month counts, kept in the stats collection as well
+BLOG_FACETS_DOCUMENT_ID = "blog_facets"
+
+def counter_key(value: Any) -> str:
+    """Normalize a field value into a key of the stats document"""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "none"
+    return str(value)
+
+async def increment_stats(changes: Dict[str, int]):
+    """Atomically apply counter changes to the stats document"""
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    collection = await get_collection(COLLECTIONS['stats'])
+    # No upsert: until the document is built by StatsService.rebuild_counters
+    # partial counters would be mistaken for totals
+    await collection.update_one({"_id": STATS_DOCUMENT_ID}, {"$inc": changes})
+
 class BaseService:
     """Base service class with common CRUD operations"""
     
+    # Order applied by get_all when no explicit sort is given
+    default_sort: SortSpec = []
+    # Date field that, together with _id, forms the keyset for cursor pagination
+    cursor_field: Optional[str] = None
+    # Stored document model whose defaults fill the fields a create payload leaves out
+    document_model: Optional[Type[BaseModel]] = None
+    # Keep the collection total in the stats document up to date on writes
+    track_stats: bool = False
+    # Fields whose per-value counts are kept in the stats document as well
+    counter_fields: List[str] = []
+    # Indexes backing the queries this service issues
+    indexes: List[IndexModel] = []
+    # Read preference of non-admin reads; None keeps the client default (primary).
+    # Overridable per collection with READ_PREFERENCE_<COLLECTION>.
+    read_preference: Optional[str] = None
+    
     def __init__(self, collection_name: str):
         self.collection_name = collection_name
+        register_indexes(collection_name, self.indexes)
+        name = os.environ.get(f"READ_PREFERENCE_{collection_name.upper()}", self.read_preference)
+        self._read_preference = read_preference_from_name(name) if name else None
     
-    async def get_collection(self):
-        return await get_collection(self.collection_name)
+    async def get_collection(self, primary: bool = False):
+        """Get the collection, routed by the service read preference unless primary is required"""
+        collection = await get_collection(self.collection_name)
+        if primary or self._read_preference is None:
+            return collection
+        return collection.with_options(read_preference=self._read_preference)
     
     async def create(self, data: dict) -> str:
         """Create new document"""
-        collection = await self.get_collection()
+        collection = await self.get_collection(primary=True)
         data["_id"] = str(uuid.uuid4())
         data["created_at"] = datetime.utcnow()
         data["updated_at"] = datetime.utcnow()
+        for field, value in self.defaults().items():
+            data.setdefault(field, value)
+        # A document without its cursor field sorts last and no cursor ever leads to it
+        if self.cursor_field and data.get(self.cursor_field) is None:
+            data[self.cursor_field] = data["created_at"]
         
         result = await collection.insert_one(data)
+        if self.track_stats:
+            await increment_stats(self.stats_changes(data, 1))
+        await self.after_write()
         return data["_id"]
     
+    def defaults(self) -> Dict[str, Any]:
+        """Field defaults of new documents; the cursor field is set from the creation time instead"""
+        if self.document_model is None:
+            return {}
+        return document_defaults(self.document_model, exclude=[self.cursor_field] if self.cursor_field else [])
+    
+    async def backfill_defaults(self) -> int:
+        """Set the cursor field and default fields of documents stored without them, returning the count"""
+        collection = await self.get_collection(primary=True)
+        modified = 0
+        if self.cursor_field:
+            result = await collection.update_many(
+                {self.cursor_field: None},
+                [{"$set": {self.cursor_field: {"$ifNull": ["$created_at", "$$NOW"]}}}]
+            )
+            modified += result.modified_count
+        for field, value in self.defaults().items():
+            result = await collection.update_many({field: {"$exists": False}}, {"$set": {field: value}})
+            modified += result.modified_count
+        if modified:
+            await self.after_write()
+        return modified
+    
+    async def after_write(self):
+        """Run after every write: refresh derived data, then invalidate caches of the collection"""
+        await cache_invalidator.touch(self.collection_name)
+    
     async def get_by_id(self, doc_id: str) -> Optional[Dict]:
         """Get document by ID"""
         collection = await self.get_collection()
@@ -32,36 +201,151 @@ class BaseService:
             doc["id"] = doc["_id"]
         return doc
     
-    async def get_all(self, filter_dict: Dict = None, limit: int = None, skip: int = 0) -> List[Dict]:
-        """Get all documents with optional filtering"""
-        collection = await self.get_collection()
-        query = filter_dict or {}
+    def build_cursor(self, collection, filter_dict: Dict = None, sort: SortSpec = None,
+                     limit: int = None, skip: int = 0, projection: Dict = None):
+        """Build a single server-side find().sort().skip().limit() cursor"""
+        sort = self.default_sort if sort is None else sort
         
-        cursor = collection.find(query).skip(skip)
+        cursor = collection.find(filter_dict or {}, projection)
+        if sort:
+            # _id as the last key keeps the order stable between pages
+            if all(field != "_id" for field, _ in sort):
+                sort = list(sort) + [("_id", sort[-1][1])]
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
         if limit:
             cursor = cursor.limit(limit)
-            
+        return cursor
+    
+    async def get_all(self, filter_dict: Dict = None, limit: int = None, skip: int = 0,
+                      sort: SortSpec = None, projection: Dict = None, primary: bool = False) -> List[Dict]:
+        """Get all documents with optional filtering, sorting, paging and projection"""
+        collection = await self.get_collection(primary=primary)
+        cursor = self.build_cursor(collection, filter_dict, sort=sort, limit=limit, skip=skip,
+                                   projection=projection)
+        
         docs = await cursor.to_list(length=None)
         for doc in docs:
             doc["id"] = doc["_id"]
         return docs
     
-    async def update(self, doc_id: str, data: dict) -> bool:
-        """Update document"""
-        collection = await self.get_collection()
+    def stats_changes(self, doc: Dict, delta: int) -> Dict[str, int]:
+        """Counter changes for a document entering (+1) or leaving (-1) the collection"""
+        changes = {f"{self.collection_name}.total": delta}
+        for field in self.counter_fields:
+            changes[f"{self.collection_name}.{field}.{counter_key(doc.get(field))}"] = delta
+        return changes
+    
+    async def count_by(self, field: str) -> Dict[str, int]:
+        """Count documents per value of a field server-side"""
+        collection = await self.get_collection(primary=True)
+        pipeline = [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+        counts = {}
+        async for group in collection.aggregate(pipeline):
+            key = counter_key(group["_id"])
+            counts[key] = counts.get(key, 0) + group["count"]
+        return counts
+    
+    def encode_cursor(self, doc: Dict) -> str:
+        """Encode the keyset position of a document as an opaque cursor"""
+        value = doc.get(self.cursor_field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([value, doc["_id"]]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    
+    def decode_cursor(self, cursor: str) -> Tuple[Optional[datetime], str]:
+        """Decode an opaque cursor back into its (cursor_field, _id) keyset"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            value, doc_id = json.loads(raw)
+            if value is not None:
+                value = datetime.fromisoformat(value)
+            return value, str(doc_id)
+        except (ValueError, TypeError):
+            raise InvalidCursorError("Invalid pagination cursor")
+    
+    async def get_page(self, filter_dict: Dict = None, limit: int = None, skip: int = 0,
+                       cursor: str = None, projection: Dict = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get one page ordered by (cursor_field, _id) descending and the cursor of the next page"""
+        if limit is not None and limit < 1:
+            raise InvalidQueryError("limit must be positive")
+        if skip < 0:
+            raise InvalidQueryError("skip must not be negative")
+        query = dict(filter_dict or {})
+        if cursor:
+            # Seek right past the encoded position instead of skipping earlier documents
+            value, doc_id = self.decode_cursor(cursor)
+            keyset = {"$or": [
+                {self.cursor_field: {"$lt": value}},
+                {self.cursor_field: value, "_id": {"$lt": doc_id}},
+            ]}
+            query = {"$and": [query, keyset]} if query else keyset
+            skip = 0
+        
+        sort = [(self.cursor_field, DESCENDING), ("_id", DESCENDING)]
+        # Fetch one extra document to know whether a next page exists
+        docs = await self.get_all(query, limit=limit + 1 if limit else None, skip=skip, sort=sort,
+                                  projection=projection)
+        
+        next_cursor = None
+        if limit and docs and len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = self.encode_cursor(docs[-1])
+        return docs, next_cursor
+    
+    async def update(self, doc_id: str, data: dict, expected: Dict = None) -> bool:
+        """Update document, only while it still has the expected field values if given"""
+        collection = await self.get_collection(primary=True)
         data["updated_at"] = datetime.utcnow()
+        filter_dict = {**(expected or {}), "_id": doc_id}
         
-        result = await collection.update_one(
-            {"_id": doc_id},
-            {"$set": data}
+        counted = [field for field in self.counter_fields if field in data] if self.track_stats else []
+        if not counted:
+            result = await collection.update_one(
+                filter_dict,
+                {"$set": data}
+            )
+            await self.after_write()
+            return result.modified_count > 0
+        
+        # Read the previous values in the same atomic operation to move the counters
+        previous = await collection.find_one_and_update(
+            filter_dict,
+            {"$set": data},
+            projection={field: 1 for field in counted}
         )
-        return result.modified_count > 0
+        if previous is None:
+            return False
+        
+        changes = {}
+        for field in counted:
+            old_key, new_key = counter_key(previous.get(field)), counter_key(data[field])
+            if old_key != new_key:
+                changes[f"{self.collection_name}.{field}.{old_key}"] = -1
+                changes[f"{self.collection_name}.{field}.{new_key}"] = 1
+        await increment_stats(changes)
+        await self.after_write()
+        return True
     
     async def delete(self, doc_id: str) -> bool:
         """Delete document"""
-        collection = await self.get_collection()
-        result = await collection.delete_one({"_id": doc_id})
-        return result.deleted_count > 0
+        collection = await self.get_collection(primary=True)
+        if not self.track_stats:
+            result = await collection.delete_one({"_id": doc_id})
+            await self.after_write()
+            return result.deleted_count > 0
+        
+        deleted = await collection.find_one_and_delete(
+            {"_id": doc_id},
+            projection={field: 1 for field in self.counter_fields}
+        )
+        if deleted is None:
+            return False
+        await increment_stats(self.stats_changes(deleted, -1))
+        await self.after_write()
+        return True
 
 class SiteInfoService(BaseService):
     def __init__(self):
@@ -69,7 +353,7 @@ class SiteInfoService(BaseService):
     
     async def get_site_info(self) -> Optional[SiteInfoResponse]:
         """Get site information"""
-        docs = await self.get_all()
+        docs = await self.get_all(limit=1)
         if docs:
             info = docs[0]
             return SiteInfoResponse(
@@ -90,16 +374,23 @@ class SiteInfoService(BaseService):
             return SiteInfoResponse(**default_info.dict())
 
 class ServicesService(BaseService):
+    document_model = Service
+    default_sort = [("order_index", ASCENDING)]
+    track_stats = True
+    read_preference = CATALOG_READ_PREFERENCE
+    indexes = [
+        IndexModel([("slug", ASCENDING)], unique=True),
+        IndexModel([("is_active", ASCENDING), ("order_index", ASCENDING), ("_id", ASCENDING)]),
+        text_index("is_active", {"title": 10, "tags": 5, "description": 3, "content": 1}),
+    ]
+    
     def __init__(self):
         super().__init__(COLLECTIONS['services'])
     
-    async def get_active_services(self) -> List[ServiceResponse]:
-        """Get all active services"""
-        services = await self.get_all({"is_active": True})
-        # Sort by order_index
-        services.sort(key=lambda x: x.get('order_index', 0))
-        
-        return [ServiceResponse(**service) for service in services]
+    async def get_active_services(self) -> List[Dict]:
+        """Get all active services shaped as ServiceResponse"""
+        services = await self.get_all({"is_active": True}, projection=projection_for(ServiceResponse))
+        return shape_documents(services, ServiceResponse, self.defaults())
     
     async def get_service_by_slug(self, slug: str) -> Optional[ServiceResponse]:
         """Get service by slug"""
@@ -111,16 +402,81 @@ class ServicesService(BaseService):
         return None
 
 class BlogService(BaseService):
+    document_model = BlogPost
+    default_sort = [("publish_date", DESCENDING)]
+    cursor_field = "publish_date"
+    track_stats = True
+    read_preference = CATALOG_READ_PREFERENCE
+    indexes = [
+        # Also serves the {slug, is_published} lookup: at most one document per slug
+        IndexModel([("slug", ASCENDING)], unique=True),
+        # Month filters are ranges on publish_date and use this index too
+        IndexModel([("is_published", ASCENDING), ("publish_date", DESCENDING), ("_id", DESCENDING)]),
+        # Multikey: one entry per tag of each post
+        IndexModel([("is_published", ASCENDING), ("tags", ASCENDING), ("publish_date", DESCENDING),
+                    ("_id", DESCENDING)]),
+        text_index("is_published", {"title": 10, "tags": 5, "excerpt": 3, "content": 1}),
+    ]
+    
     def __init__(self):
         super().__init__(COLLECTIONS['blog_posts'])
     
-    async def get_published_posts(self, limit: int = None, skip: int = 0) -> List[BlogPostResponse]:
-        """Get published blog posts"""
-        posts = await self.get_all({"is_published": True}, limit=limit, skip=skip)
-        # Sort by publish_date descending
-        posts.sort(key=lambda x: x.get('publish_date', datetime.min), reverse=True)
+    async def get_published_posts(self, limit: int = None, skip: int = 0, cursor: str = None,
+                                  summary: bool = False, tag: str = None,
+                                  month: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of published blog posts, optionally without content, and the cursor of the next page"""
+        query = {"is_published": True}
+        if tag:
+            query["tags"] = tag
+        if month:
+            start, end = month_range(month)
+            query["publish_date"] = {"$gte": start, "$lt": end}
         
-        return [BlogPostResponse(**post) for post in posts]
+        model = BlogPostSummary if summary else BlogPostResponse
+        posts, next_cursor = await self.get_page(query, limit=limit, skip=skip, cursor=cursor,
+                                                 projection=projection_for(model))
+        return shape_documents(posts, model, self.defaults()), next_cursor
+    
+    async def after_write(self):
+        await self.refresh_facets()
+        await super().after_write()
+    
+    async def refresh_facets(self) -> Dict:
+        """Recount published posts per tag and per month into the facets document"""
+        collection = await self.get_collection(primary=True)
+        pipeline = [
+            {"$match": {"is_published": True}},
+            {"$facet": {
+                "tags": [
+                    {"$unwind": "$tags"},
+                    {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                    {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+                    {"$project": {"_id": 0, "tag": "$_id", "count": 1}},
+                ],
+                "months": [
+                    {"$match": {"publish_date": {"$type": "date"}}},
+                    {"$group": {"_id": {"$dateToString": {"format": "%Y-%m", "date": "$publish_date"}},
+                                "count": {"$sum": 1}}},
+                    {"$sort": {"_id": DESCENDING}},
+                    {"$project": {"_id": 0, "month": "$_id", "count": 1}},
+                ],
+            }},
+        ]
+        facets = (await collection.aggregate(pipeline).to_list(length=1))[0]
+        
+        doc = {"_id": BLOG_FACETS_DOCUMENT_ID, "tags": facets["tags"], "months": facets["months"],
+               "updated_at": datetime.utcnow()}
+        stats_collection = await get_collection(COLLECTIONS['stats'])
+        await stats_collection.replace_one({"_id": BLOG_FACETS_DOCUMENT_ID}, doc, upsert=True)
+        return doc
+    
+    async def get_facets(self) -> Dict:
+        """Get the precomputed tag and month counts, building them on first use"""
+        stats_collection = await get_collection(COLLECTIONS['stats'])
+        doc = await stats_collection.find_one({"_id": BLOG_FACETS_DOCUMENT_ID})
+        if doc is None:
+            doc = await self.refresh_facets()
+        return doc
     
     async def get_post_by_slug(self, slug: str) -> Optional[BlogPostResponse]:
         """Get blog post by slug"""
@@ -128,116 +484,473 @@ class BlogService(BaseService):
         post = await collection.find_one({"slug": slug, "is_published": True})
         if post:
             post["id"] = post["_id"]
-            # Increment views
-            await collection.update_one(
-                {"_id": post["_id"]},
-                {"$inc": {"views": 1}}
-            )
+            # Count the view in memory; it is written later in a batch
+            post["views"] = post.get("views", 0) + blog_view_counter.record(slug)
             return BlogPostResponse(**post)
         return None
 
+class ViewCounter:
+    """Buffers view increments per slug in memory and writes them with one bulk_write"""
+    
+    def __init__(self, collection_name: str, interval: float = VIEW_FLUSH_INTERVAL_SECONDS):
+        self.collection_name = collection_name
+        self.interval = interval
+        self.pending: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def record(self, slug: str) -> int:
+        """Count one view and return the views of the slug not yet written"""
+        self.pending[slug] = self.pending.get(slug, 0) + 1
+        return self.pending[slug]
+    
+    async def flush(self):
+        """Write all buffered views"""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        slugs = list(batch)
+        operations = [UpdateOne({"slug": slug}, {"$inc": {"views": batch[slug]}}) for slug in slugs]
+        
+        collection = await get_collection(self.collection_name)
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            failed = [slugs[error["index"]] for error in exc.details.get("writeErrors", [])]
+            self._requeue({slug: batch[slug] for slug in failed})
+            logger.warning("Failed to write views of %d posts", len(failed))
+        except PyMongoError as exc:
+            self._requeue(batch)
+            logger.warning("Failed to write post views: %s", exc)
+    
+    def _requeue(self, batch: Dict[str, int]):
+        for slug, views in batch.items():
+            self.pending[slug] = self.pending.get(slug, 0) + views
+    
+    async def start(self):
+        """Start flushing periodically in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the periodic flush and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
 class ReviewsService(BaseService):
+    document_model = Review
+    default_sort = [("date", DESCENDING)]
+    cursor_field = "date"
+    track_stats = True
+    counter_fields = ["is_approved"]
+    indexes = [
+        IndexModel([("is_approved", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("is_approved", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+    
     def __init__(self):
         super().__init__(COLLECTIONS['reviews'])
     
-    async def get_approved_reviews(self, limit: int = None) -> List[ReviewResponse]:
-        """Get approved reviews"""
-        reviews = await self.get_all({"is_approved": True}, limit=limit)
-        # Sort by date descending
-        reviews.sort(key=lambda x: x.get('date', datetime.min), reverse=True)
-        
-        return [ReviewResponse(**review) for review in reviews]
+    async def get_approved_reviews(self, limit: int = None,
+                                   cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of approved reviews shaped as ReviewResponse and the cursor of the next page"""
+        reviews, next_cursor = await self.get_page({"is_approved": True}, limit=limit, cursor=cursor,
+                                                   projection=projection_for(ReviewResponse))
+        return shape_documents(reviews, ReviewResponse, self.defaults()), next_cursor
     
     async def get_pending_reviews(self) -> List[ReviewResponse]:
         """Get reviews pending approval"""
-        reviews = await self.get_all({"is_approved": False})
-        reviews.sort(key=lambda x: x.get('created_at', datetime.min), reverse=True)
-        
+        reviews = await self.get_all({"is_approved": False}, sort=[("created_at", DESCENDING)],
+                                     projection=projection_for(ReviewResponse))
         return [ReviewResponse(**review) for review in reviews]
 
 class NewsService(BaseService):
+    document_model = News
+    default_sort = [("publish_date", DESCENDING)]
+    cursor_field = "publish_date"
+    read_preference = CATALOG_READ_PREFERENCE
+    indexes = [
+        IndexModel([("is_published", ASCENDING), ("publish_date", DESCENDING), ("_id", DESCENDING)]),
+        text_index("is_published", {"title": 10, "excerpt": 3, "content": 1}),
+    ]
+    
     def __init__(self):
         super().__init__(COLLECTIONS['news'])
     
-    async def get_published_news(self, limit: int = None) -> List[NewsResponse]:
-        """Get published news"""
-        news = await self.get_all({"is_published": True}, limit=limit)
-        # Sort by publish_date descending
-        news.sort(key=lambda x: x.get('publish_date', datetime.min), reverse=True)
-        
-        return [NewsResponse(**news_item) for news_item in news]
+    async def get_published_news(self, limit: int = None, cursor: str = None,
+                                 summary: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of published news, optionally without content, and the cursor of the next page"""
+        model = NewsSummary if summary else NewsResponse
+        news, next_cursor = await self.get_page({"is_published": True}, limit=limit, cursor=cursor,
+                                                projection=projection_for(model))
+        return shape_documents(news, model, self.defaults()), next_cursor
 
 class GalleryService(BaseService):
+    document_model = Gallery
+    default_sort = [("order_index", ASCENDING)]
+    track_stats = True
+    read_preference = CATALOG_READ_PREFERENCE
+    indexes = [
+        IndexModel([("is_active", ASCENDING), ("order_index", ASCENDING), ("_id", ASCENDING)]),
+    ]
+    
     def __init__(self):
         super().__init__(COLLECTIONS['gallery'])
     
-    async def get_active_images(self) -> List[GalleryResponse]:
-        """Get active gallery images"""
-        images = await self.get_all({"is_active": True})
-        # Sort by order_index
-        images.sort(key=lambda x: x.get('order_index', 0))
+    async def get_active_images(self) -> List[Dict]:
+        """Get active gallery images shaped as GalleryResponse"""
+        images = await self.get_all({"is_active": True}, projection=projection_for(GalleryResponse))
+        return shape_documents(images, GalleryResponse, self.defaults())
+
+class AvailabilityService(BaseService):
+    """Daily slots per service holding the number of people booked, keyed <service_id>:<YYYY-MM-DD>"""
+    
+    def __init__(self):
+        super().__init__(COLLECTIONS['availability'])
+    
+    @staticmethod
+    def slot_id(service_id: str, day: date) -> str:
+        return f"{service_id}:{day.isoformat()}"
+    
+    @staticmethod
+    def slot_day(slot_id: str) -> date:
+        return date.fromisoformat(slot_id.rsplit(":", 1)[1])
+    
+    @staticmethod
+    def capacity_of(daily_capacity: Optional[int]) -> Optional[int]:
+        """People bookable per day given the service setting, None when unlimited"""
+        if daily_capacity is None and DEFAULT_DAILY_CAPACITY:
+            return int(DEFAULT_DAILY_CAPACITY)
+        return daily_capacity
+    
+    async def reserve(self, service: Dict, day: date, people: int) -> Optional[str]:
+        """Atomically take places in a slot and return its id; None when the service has no capacity"""
+        if people < 1:
+            raise BookingRejectedError("At least one person is required")
+        capacity = self.capacity_of(service.get("daily_capacity"))
+        if capacity is None:
+            return None
+        if people > capacity:
+            raise BookingRejectedError("Not enough places left on this date")
         
-        return [GalleryResponse(**image) for image in images]
+        slot_id = self.slot_id(service["_id"], day)
+        collection = await self.get_collection(primary=True)
+        try:
+            # Matches only while the places fit; a new slot is created on first booking
+            await collection.update_one(
+                {"_id": slot_id, "booked": {"$lte": capacity - people}},
+                {
+                    "$inc": {"booked": people},
+                    "$set": {"capacity": capacity},
+                    "$setOnInsert": {"service_id": service["_id"], "date": datetime(day.year, day.month, day.day)},
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The slot exists but the places do not fit, so the upsert collided with it
+            raise BookingRejectedError("Not enough places left on this date")
+        return slot_id
+    
+    async def release(self, slot_id: str, people: int):
+        """Give places of a slot back"""
+        if people < 1:
+            raise ValueError("At least one place must be released")
+        collection = await self.get_collection(primary=True)
+        await collection.update_one({"_id": slot_id}, {"$inc": {"booked": -people}})
+    
+    async def get_availability(self, service_id: str, daily_capacity: Optional[int],
+                               start: date, end: date) -> List[Dict]:
+        """Get capacity and places booked per day from start to end inclusive, shaped as SlotAvailability"""
+        collection = await self.get_collection()
+        # Slot ids sort by service then ISO date, so the range is a scan of the _id index
+        slots = await collection.find(
+            {"_id": {"$gte": self.slot_id(service_id, start), "$lte": self.slot_id(service_id, end)}},
+            {"booked": 1}
+        ).to_list(length=None)
+        booked = {slot["_id"]: slot["booked"] for slot in slots}
+        
+        capacity = self.capacity_of(daily_capacity)
+        days = []
+        day = start
+        while day <= end:
+            taken = booked.get(self.slot_id(service_id, day), 0)
+            days.append({
+                "date": day.isoformat(),
+                "capacity": capacity,
+                "booked": taken,
+                "available": max(capacity - taken, 0) if capacity is not None else None,
+            })
+            day += timedelta(days=1)
+        return days
+    
+    async def rebuild(self) -> int:
+        """Recount booked places per slot from the bookings and return the number of slots corrected"""
+        bookings = await booking_service.get_collection(primary=True)
+        pipeline = [
+            {"$match": {"slot_id": {"$ne": None}, "status": {"$ne": BookingStatus.CANCELLED.value}}},
+            {"$group": {"_id": "$slot_id", "booked": {"$sum": {"$ifNull": ["$people_count", 1]}}}},
+        ]
+        counted = {group["_id"]: group["booked"] async for group in bookings.aggregate(pipeline)}
+        
+        collection = await self.get_collection(primary=True)
+        operations = []
+        async for slot in collection.find({}, {"booked": 1}):
+            booked = counted.pop(slot["_id"], 0)
+            if slot.get("booked") != booked:
+                operations.append(UpdateOne({"_id": slot["_id"]}, {"$set": {"booked": booked}}))
+        for slot_id, booked in counted.items():
+            day = self.slot_day(slot_id)
+            operations.append(UpdateOne(
+                {"_id": slot_id},
+                {"$set": {"booked": booked, "service_id": slot_id.rsplit(":", 1)[0],
+                          "date": datetime(day.year, day.month, day.day)}},
+                upsert=True
+            ))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        return len(operations)
 
 class BookingService(BaseService):
+    default_sort = [("created_at", DESCENDING)]
+    cursor_field = "created_at"
+    track_stats = True
+    counter_fields = ["status"]
+    indexes = [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("preferred_date", ASCENDING)]),
+    ]
+    # Rows fetched per round trip when exporting
+    export_batch_size = 500
+    
     def __init__(self):
         super().__init__(COLLECTIONS['bookings'])
     
     async def create_booking(self, booking_data: BookingCreate) -> str:
-        """Create new booking"""
+        """Create new booking, taking its places on the preferred date when the service has a capacity"""
         booking = Booking(**booking_data.dict())
         booking_dict = booking.dict()
-        return await self.create(booking_dict)
+        people = booking.people_count or 1
+        
+        if booking.service_id and booking.preferred_date:
+            service = await services_service.get_by_id(booking.service_id)
+            if service:
+                if service.get("max_people") and people > service["max_people"]:
+                    raise BookingRejectedError(f"At most {service['max_people']} people per booking")
+                # The date as the client sent it, in its own UTC offset
+                booking_dict["slot_id"] = await availability_service.reserve(
+                    service, booking.preferred_date.date(), people
+                )
+        
+        # The notification event is written with the booking and delivered in the background
+        booking_dict["outbox"] = outbox_entry()
+        try:
+            booking_id = await self.create(booking_dict)
+        except Exception:
+            if booking_dict["slot_id"]:
+                await availability_service.release(booking_dict["slot_id"], people)
+            raise
+        notification_dispatcher.wake()
+        return booking_id
     
-    async def get_bookings_by_status(self, status: BookingStatus = None) -> List[BookingResponse]:
-        """Get bookings by status"""
+    async def get_bookings_page(self, status: BookingStatus = None, limit: int = None,
+                                cursor: str = None) -> Tuple[List[BookingResponse], Optional[str]]:
+        """Get a page of bookings, newest first, and the cursor of the next page"""
         query = {"status": status} if status else {}
-        bookings = await self.get_all(query)
-        bookings.sort(key=lambda x: x.get('created_at', datetime.min), reverse=True)
-        
-        return [BookingResponse(**booking) for booking in bookings]
+        bookings, next_cursor = await self.get_page(query, limit=limit, cursor=cursor,
+                                                    projection=projection_for(BookingResponse))
+        return [BookingResponse(**booking) for booking in bookings], next_cursor
+    
+    def export_query(self, status: BookingStatus = None, start: date = None, end: date = None,
+                     date_field: BookingDateField = BookingDateField.CREATED_AT) -> Dict:
+        """Build the filter of an export: a status and an inclusive range of days of one date field"""
+        if start and end and end < start:
+            raise InvalidQueryError("The end of the range is before its start")
+        query: Dict[str, Any] = {"status": status} if status else {}
+        day_range = {}
+        if start:
+            day_range["$gte"] = datetime.combine(start, datetime.min.time())
+        if end:
+            day_range["$lt"] = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        if day_range:
+            query[date_field.value] = day_range
+        return query
+    
+    async def iter_export(self, query: Dict, fields: List[str]) -> AsyncIterator[Dict]:
+        """Yield matching bookings oldest first, one batch in memory at a time"""
+        collection = await self.get_collection()
+        cursor = collection.find(query, {field: 1 for field in fields}).sort(
+            [("created_at", ASCENDING), ("_id", ASCENDING)]
+        ).batch_size(self.export_batch_size)
+        async for booking in cursor:
+            yield booking
     
     async def update_booking_status(self, booking_id: str, status: BookingStatus, admin_notes: str = None) -> bool:
-        """Update booking status"""
+        """Update booking status, giving its places back on cancellation and taking them again on reopening"""
         update_data = {"status": status}
         if admin_notes:
             update_data["admin_notes"] = admin_notes
+        
+        collection = await self.get_collection(primary=True)
+        cancelled = status == BookingStatus.CANCELLED
+        for _ in range(STATUS_UPDATE_ATTEMPTS):
+            booking = await collection.find_one({"_id": booking_id}, {"status": 1, "slot_id": 1, "people_count": 1})
+            if booking is None:
+                return False
+            slot_id = booking.get("slot_id")
+            people = booking.get("people_count") or 1
+            was_cancelled = booking.get("status") == BookingStatus.CANCELLED
+            
+            reserved = False
+            if slot_id and was_cancelled and not cancelled:
+                # The date may have filled up since the cancellation
+                service = await services_service.get_by_id(slot_id.rsplit(":", 1)[0])
+                if service:
+                    reserved = await availability_service.reserve(
+                        service, AvailabilityService.slot_day(slot_id), people
+                    ) is not None
             
-        return await self.update(booking_id, update_data)
+            # Only the request that moves the booking out of the status it read touches the slot
+            if await self.update(booking_id, dict(update_data), expected={"status": booking.get("status")}):
+                if slot_id and cancelled and not was_cancelled:
+                    await availability_service.release(slot_id, people)
+                return True
+            if reserved:
+                await availability_service.release(slot_id, people)
+        raise BookingRejectedError("The booking is being changed concurrently, please retry")
+
+# Word boundary for title prefixes; \b is ASCII-only in MongoDB regexes and misses Cyrillic
+TITLE_PREFIX_PATTERN = r'(^|[\s"«(—-]){}'
+
+class SearchService:
+    """Ranked full-text search and title prefix matching across the public catalog"""
+    
+    def __init__(self, sources: Dict[SearchType, Tuple[BaseService, Dict, Dict[str, str]]]):
+        # Per type: the service, the visibility filter and SearchHit field -> document field
+        self.sources = sources
+    
+    async def search(self, query: str, types: List[SearchType] = None, limit: int = 10, skip: int = 0,
+                     prefix: bool = False) -> List[Dict]:
+        """Get a page of hits shaped as SearchHit, best matches first"""
+        types = types or list(self.sources)
+        results = await asyncio.gather(*(
+            self._search_source(search_type, query, skip + limit, prefix) for search_type in types
+        ))
+        hits = [hit for source_hits in results for hit in source_hits]
+        if prefix:
+            lowered = query.lower()
+            hits.sort(key=lambda hit: (not hit["title"].lower().startswith(lowered), hit["title"].lower()))
+        else:
+            hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[skip:skip + limit]
+    
+    async def _search_source(self, search_type: SearchType, query: str, limit: int, prefix: bool) -> List[Dict]:
+        """Get the best hits of one collection"""
+        service, visible, fields = self.sources[search_type]
+        projection = {key: 1 for key in fields.values()}
+        if prefix:
+            pattern = TITLE_PREFIX_PATTERN.format(re.escape(query))
+            filter_dict = {**visible, "title": {"$regex": pattern, "$options": "i"}}
+            sort = [("title", ASCENDING)]
+        else:
+            filter_dict = {**visible, "$text": {"$search": query}}
+            projection["score"] = {"$meta": "textScore"}
+            sort = [("score", {"$meta": "textScore"})]
+        
+        collection = await service.get_collection()
+        docs = await collection.find(filter_dict, projection).sort(sort).limit(limit).to_list(length=limit)
+        hits = []
+        for doc in docs:
+            hit = {name: doc.get(fields[name]) if name in fields else None for name in SearchHit.model_fields}
+            hit["type"] = search_type.value
+            hit["score"] = doc.get("score")
+            hits.append(hit)
+        return hits
 
 class StatsService:
     """Service for admin statistics"""
     
+    def tracked_services(self) -> List[BaseService]:
+        """Services whose counters are kept in the stats document"""
+        return [booking_service, reviews_service, services_service, blog_service, gallery_service]
+    
+    async def get_collection(self):
+        return await get_collection(COLLECTIONS['stats'])
+    
     async def get_dashboard_stats(self) -> Statistics:
-        """Get dashboard statistics"""
-        bookings_service = BookingService()
-        reviews_service = ReviewsService()
-        services_service = ServicesService()
-        blog_service = BlogService()
-        gallery_service = GalleryService()
-        
-        # Get counts
-        total_bookings = len(await bookings_service.get_all())
-        pending_bookings = len(await bookings_service.get_bookings_by_status(BookingStatus.NEW))
-        
-        total_reviews = len(await reviews_service.get_all())
-        pending_reviews = len(await reviews_service.get_pending_reviews())
+        """Get dashboard statistics from the materialized counters"""
+        collection = await self.get_collection()
+        doc = await collection.find_one({"_id": STATS_DOCUMENT_ID})
+        if doc is None:
+            await self.rebuild_counters()
+            doc = await collection.find_one({"_id": STATS_DOCUMENT_ID}) or {}
         
-        total_services = len(await services_service.get_all())
-        total_blog_posts = len(await blog_service.get_all())
-        total_gallery_images = len(await gallery_service.get_all())
+        bookings = doc.get(COLLECTIONS['bookings'], {})
+        reviews = doc.get(COLLECTIONS['reviews'], {})
         
         return Statistics(
-            total_bookings=total_bookings,
-            pending_bookings=pending_bookings,
-            total_reviews=total_reviews,
-            pending_reviews=pending_reviews,
-            total_services=total_services,
-            total_blog_posts=total_blog_posts,
-            total_gallery_images=total_gallery_images
+            total_bookings=max(bookings.get("total", 0), 0),
+            pending_bookings=max(bookings.get("status", {}).get(BookingStatus.NEW.value, 0), 0),
+            bookings_by_status={
+                status.value: max(bookings.get("status", {}).get(status.value, 0), 0) for status in BookingStatus
+            },
+            total_reviews=max(reviews.get("total", 0), 0),
+            pending_reviews=max(reviews.get("is_approved", {}).get("false", 0), 0),
+            total_services=max(doc.get(COLLECTIONS['services'], {}).get("total", 0), 0),
+            total_blog_posts=max(doc.get(COLLECTIONS['blog_posts'], {}).get("total", 0), 0),
+            total_gallery_images=max(doc.get(COLLECTIONS['gallery'], {}).get("total", 0), 0)
         )
+    
+    async def rebuild_counters(self) -> Dict[str, int]:
+        """Recount the stats document from the collections and return the drift found"""
+        collection = await self.get_collection()
+        previous = await collection.find_one({"_id": STATS_DOCUMENT_ID}) or {}
+        
+        doc = {"_id": STATS_DOCUMENT_ID}
+        for service in self.tracked_services():
+            service_collection = await service.get_collection(primary=True)
+            total, *by_field = await asyncio.gather(
+                service_collection.count_documents({}),
+                *[service.count_by(field) for field in service.counter_fields]
+            )
+            doc[service.collection_name] = {"total": total, **dict(zip(service.counter_fields, by_field))}
+        
+        drift = {}
+        for name, counters in doc.items():
+            if name == "_id":
+                continue
+            old_counters = self._flatten(previous.get(name, {}))
+            for key, value in self._flatten(counters).items():
+                old_value = old_counters.get(key, 0)
+                if old_value != value:
+                    drift[f"{name}.{key}"] = value - old_value
+        
+        doc["rebuilt_at"] = datetime.utcnow()
+        await collection.replace_one({"_id": STATS_DOCUMENT_ID}, doc, upsert=True)
+        return drift
+    
+    @staticmethod
+    def _flatten(counters: Dict, prefix: str = "") -> Dict[str, int]:
+        flat = {}
+        for key, value in counters.items():
+            if isinstance(value, dict):
+                flat.update(StatsService._flatten(value, f"{prefix}{key}."))
+            else:
+                flat[f"{prefix}{key}"] = value
+        return flat
 
 # Initialize services
+blog_view_counter = ViewCounter(COLLECTIONS['blog_posts'])
 site_info_service = SiteInfoService()
 services_service = ServicesService()
 blog_service = BlogService()
@@ -245,4 +958,17 @@ reviews_service = ReviewsService()
 news_service = NewsService()
 gallery_service = GalleryService()
 booking_service = BookingService()
+availability_service = AvailabilityService()
+search_service = SearchService({
+    SearchType.BLOG: (blog_service, {"is_published": True}, {
+        "id": "_id", "title": "title", "slug": "slug", "excerpt": "excerpt", "image": "image", "image_srcset": "image_srcset",
+        "publish_date": "publish_date",
+    }),
+    SearchType.NEWS: (news_service, {"is_published": True}, {
+        "id": "_id", "title": "title", "excerpt": "excerpt", "image": "image", "image_srcset": "image_srcset", "publish_date": "publish_date",
+    }),
+    SearchType.SERVICES: (services_service, {"is_active": True}, {
+        "id": "_id", "title": "title", "slug": "slug", "excerpt": "description", "image": "image", "image_srcset": "image_srcset",
+    }),
+})
 stats_service = StatsService()
\ No newline at end of file
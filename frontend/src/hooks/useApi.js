@@ -1,4 +1,5 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
+import { getNextCursor } from '../services/api';
 
 // Generic hook for API calls with loading and error states
 export const useApi = (apiCall, dependencies = []) => {
@@ -43,6 +44,61 @@ export const useApi = (apiCall, dependencies = []) => {
   return { data, loading, error, refetch };
 };
 
+// Hook for cursor-paged lists: apiCall(cursor) fetches a page, the first one without a cursor
+export const useCursorPages = (apiCall, dependencies = []) => {
+  const [items, setItems] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [error, setError] = useState(null);
+  // Pages of an earlier request that finish after the dependencies changed are dropped
+  const generation = useRef(0);
+
+  const refetch = async () => {
+    const current = ++generation.current;
+    try {
+      setLoading(true);
+      setError(null);
+
+      const response = await apiCall();
+      if (current !== generation.current) return;
+      setItems(response.data);
+      setNextCursor(getNextCursor(response));
+    } catch (err) {
+      if (current !== generation.current) return;
+      setError(err.response?.data?.detail || err.message || 'An error occurred');
+      console.error('API Error:', err);
+    } finally {
+      if (current === generation.current) setLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    refetch();
+  }, dependencies);
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    const current = generation.current;
+    try {
+      setLoadingMore(true);
+
+      const response = await apiCall(nextCursor);
+      if (current !== generation.current) return;
+      setItems((previous) => [...previous, ...response.data]);
+      setNextCursor(getNextCursor(response));
+    } catch (err) {
+      if (current !== generation.current) return;
+      setError(err.response?.data?.detail || err.message || 'An error occurred');
+      console.error('API Error:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  return { items, loading, loadingMore, error, hasMore: Boolean(nextCursor), loadMore, refetch };
+};
+
 // Hook for mutations (POST, PUT, DELETE)
 export const useMutation = () => {
   const [loading, setLoading] = useState(false);
@@ -77,4 +133,4 @@ export const useMutation = () => {
   return { mutate, loading, error };
 };
 
-export default { useApi, useMutation };
\ No newline at end of file
+export default { useApi, useCursorPages, useMutation };
\ No newline at end of file
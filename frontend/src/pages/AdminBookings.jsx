@@ -5,8 +5,8 @@ import { Card } from '../components/ui/card';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { Textarea } from '../components/ui/textarea';
 import { Badge } from '../components/ui/badge';
-import { useApi, useMutation } from '../hooks/useApi';
-import { bookingAPI } from '../services/api';
+import { useApi, useCursorPages, useMutation } from '../hooks/useApi';
+import { adminAPI, bookingAPI } from '../services/api';
 import { useToast } from '../hooks/use-toast';
 import LoadingSpinner, { LoadingSection } from '../components/LoadingSpinner';
 import ErrorMessage from '../components/ErrorMessage';
@@ -16,7 +16,18 @@ const AdminBookings = () => {
   const [expandedBooking, setExpandedBooking] = useState(null);
   const [adminNotes, setAdminNotes] = useState('');
   
-  const { data: bookings, loading, error, refetch } = useApi(() => bookingAPI.getAllBookings());
+  const {
+    items: bookings, loading, loadingMore, error, hasMore, loadMore, refetch
+  } = useCursorPages(
+    (cursor) => bookingAPI.getAllBookings({
+      cursor,
+      status: selectedStatus === 'all' ? undefined : selectedStatus
+    }),
+    [selectedStatus]
+  );
+  // Counts come from the stats counters: the list only holds the pages loaded so far
+  const { data: stats, refetch: refetchStats } = useApi(() => adminAPI.getStats());
+  const statusCount = (status) => stats?.bookings_by_status?.[status] || 0;
   const { mutate: updateStatus, loading: updating } = useMutation();
   const { toast } = useToast();
 
@@ -32,6 +43,7 @@ const AdminBookings = () => {
           setAdminNotes('');
           setExpandedBooking(null);
           refetch();
+          refetchStats();
         },
         (error) => {
           toast({
@@ -91,11 +103,6 @@ const AdminBookings = () => {
     }
   };
 
-  const filteredBookings = bookings?.filter(booking => {
-    if (selectedStatus === 'all') return true;
-    return booking.status === selectedStatus;
-  }) || [];
-
   const BookingCard = ({ booking }) => {
     const isExpanded = expandedBooking === booking.id;
     const StatusIcon = getStatusIcon(booking.status);
@@ -269,7 +276,7 @@ const AdminBookings = () => {
           <div className="flex items-center">
             <Calendar className="h-8 w-8 text-blue-500 mr-3" />
             <div>
-              <p className="text-2xl font-bold">{bookings?.length || 0}</p>
+              <p className="text-2xl font-bold">{stats?.total_bookings || 0}</p>
               <p className="text-sm text-gray-600">Всего заявок</p>
             </div>
           </div>
@@ -280,7 +287,7 @@ const AdminBookings = () => {
             <Clock className="h-8 w-8 text-yellow-500 mr-3" />
             <div>
               <p className="text-2xl font-bold">
-                {bookings?.filter(b => b.status === 'new').length || 0}
+                {statusCount('new')}
               </p>
               <p className="text-sm text-gray-600">Новые</p>
             </div>
@@ -292,7 +299,7 @@ const AdminBookings = () => {
             <CheckCircle className="h-8 w-8 text-green-500 mr-3" />
             <div>
               <p className="text-2xl font-bold">
-                {bookings?.filter(b => b.status === 'confirmed').length || 0}
+                {statusCount('confirmed')}
               </p>
               <p className="text-sm text-gray-600">Подтверждены</p>
             </div>
@@ -304,7 +311,7 @@ const AdminBookings = () => {
             <CheckCircle className="h-8 w-8 text-blue-500 mr-3" />
             <div>
               <p className="text-2xl font-bold">
-                {bookings?.filter(b => b.status === 'completed').length || 0}
+                {statusCount('completed')}
               </p>
               <p className="text-sm text-gray-600">Завершены</p>
             </div>
@@ -331,8 +338,8 @@ const AdminBookings = () => {
 
       {/* Bookings List */}
       <div className="space-y-4">
-        {filteredBookings.length > 0 ? (
-          filteredBookings.map((booking) => (
+        {bookings.length > 0 ? (
+          bookings.map((booking) => (
             <BookingCard key={booking.id} booking={booking} />
           ))
         ) : (
@@ -349,6 +356,21 @@ const AdminBookings = () => {
             </p>
           </Card>
         )}
+
+        {hasMore && (
+          <div className="text-center">
+            <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? (
+                <div className="flex items-center">
+                  <LoadingSpinner size="sm" />
+                  <span className="ml-2">Загрузка...</span>
+                </div>
+              ) : (
+                'Показать ещё'
+              )}
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -19,7 +19,7 @@ const AdminDashboard = () => {
   const navigate = useNavigate();
   
   const { data: stats, loading: statsLoading, error: statsError } = useApi(() => adminAPI.getStats());
-  const { data: bookings, loading: bookingsLoading } = useApi(() => bookingAPI.getAllBookings());
+  const { data: bookings, loading: bookingsLoading } = useApi(() => bookingAPI.getAllBookings({ limit: 6 }));
   const { data: pendingReviews, loading: reviewsLoading } = useApi(() => reviewsAPI.getPendingReviews());
 
   // Redirect if not authenticated
@@ -46,7 +46,18 @@ api.interceptors.response.use(
   }
 );
 
+// Cursor of the next page returned by paginated list endpoints (null on the last page)
+export const getNextCursor = (response) => response.headers['x-next-cursor'] || null;
+
+// Pass the same key (e.g. crypto.randomUUID() made once per form) when retrying a submission
+const idempotencyHeaders = (idempotencyKey) => (idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {});
+
 // API Services
+// Site info, services, gallery, latest reviews, news and blog posts of the homepage in one request
+export const bootstrapAPI = {
+  getBootstrap: () => api.get('/bootstrap'),
+};
+
 export const siteInfoAPI = {
   getSiteInfo: () => api.get('/site-info'),
 };
@@ -54,6 +65,8 @@ export const siteInfoAPI = {
 export const servicesAPI = {
   getServices: () => api.get('/services'),
   getServiceBySlug: (slug) => api.get(`/services/${slug}`),
+  // from/to: YYYY-MM-DD dates, inclusive
+  getAvailability: (slug, from, to) => api.get(`/services/${slug}/availability`, { params: { from, to } }),
   // Admin endpoints
   getAdminServices: () => api.get('/admin/services'),
   createService: (serviceData) => api.post('/admin/services', serviceData),
@@ -62,8 +75,10 @@ export const servicesAPI = {
 };
 
 export const blogAPI = {
-  getPosts: (limit = 10, skip = 0) => api.get('/blog/posts', { params: { limit, skip } }),
+  getPosts: (limit = 10, skip = 0, cursor, summary, { tag, month } = {}) => api.get('/blog/posts', { params: { limit, skip, cursor, summary, tag, month } }),
   getPostBySlug: (slug) => api.get(`/blog/posts/${slug}`),
+  getTags: () => api.get('/blog/tags'),
+  getArchive: () => api.get('/blog/archive'),
   // Admin endpoints
   getAdminPosts: () => api.get('/admin/blog/posts'),
   createPost: (postData) => api.post('/admin/blog/posts', postData),
@@ -72,8 +87,9 @@ export const blogAPI = {
 };
 
 export const reviewsAPI = {
-  getReviews: (limit = 20) => api.get('/reviews', { params: { limit } }),
-  createReview: (reviewData) => api.post('/reviews', reviewData),
+  getReviews: (limit = 20, cursor) => api.get('/reviews', { params: { limit, cursor } }),
+  createReview: (reviewData, idempotencyKey) =>
+    api.post('/reviews', reviewData, { headers: idempotencyHeaders(idempotencyKey) }),
   // Admin endpoints
   getPendingReviews: () => api.get('/admin/reviews/pending'),
   approveReview: (id) => api.put(`/admin/reviews/${id}/approve`),
@@ -81,21 +97,34 @@ export const reviewsAPI = {
 };
 
 export const newsAPI = {
-  getNews: (limit = 10) => api.get('/news', { params: { limit } }),
+  getNews: (limit = 10, cursor, summary) => api.get('/news', { params: { limit, cursor, summary } }),
   // Admin endpoints
   createNews: (newsData) => api.post('/admin/news', newsData),
   updateNews: (id, newsData) => api.put(`/admin/news/${id}`, newsData),
   deleteNews: (id) => api.delete(`/admin/news/${id}`),
 };
 
+export const searchAPI = {
+  // types: comma-separated subset of "blog,news,services"; prefix: title autocomplete
+  search: (q, { types, prefix, limit = 10, skip = 0 } = {}) => api.get('/search', { params: { q, types, prefix, limit, skip } }),
+};
+
 export const galleryAPI = {
   getImages: () => api.get('/gallery'),
 };
 
 export const bookingAPI = {
-  createBooking: (bookingData) => api.post('/bookings', bookingData),
+  createBooking: (bookingData, idempotencyKey) =>
+    api.post('/bookings', bookingData, { headers: idempotencyHeaders(idempotencyKey) }),
   // Admin endpoints
-  getAllBookings: () => api.get('/admin/bookings'),
+  getAllBookings: ({ limit, cursor, status } = {}) => api.get('/admin/bookings', { params: { limit, cursor, status } }),
+  getBookingAnalytics: ({ from, to, interval, dateField } = {}) =>
+    api.get('/admin/analytics/bookings', { params: { from, to, interval, date_field: dateField } }),
+  exportBookings: ({ format = 'csv', status, from, to, dateField } = {}) =>
+    api.get('/admin/bookings/export', {
+      params: { format, status, from, to, date_field: dateField },
+      responseType: 'blob',
+    }),
   updateBookingStatus: (id, status, adminNotes) => 
     api.put(`/admin/bookings/${id}/status`, { status, admin_notes: adminNotes }),
 };
@@ -111,6 +140,11 @@ export const authAPI = {
 
 export const adminAPI = {
   getStats: () => api.get('/admin/stats'),
+  // file: a File/Blob sent as the raw body; returns { image, image_srcset, width, height }
+  uploadImage: (file) => api.post('/admin/uploads', file, {
+    headers: { 'Content-Type': file.type || 'application/octet-stream' },
+  }),
+  collectUploadGarbage: () => api.post('/admin/uploads/gc'),
 };
 
 // Auth helper functions
@@ -0,0 +1,34 @@
+from datetime import date
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from models import BookingCreate, MAX_PEOPLE_PER_BOOKING
+from services import availability_service, BookingRejectedError
+
+SERVICE = {"_id": "service", "daily_capacity": 10}
+
+@pytest.mark.parametrize("people_count", [-20, 0, MAX_PEOPLE_PER_BOOKING + 1])
+def test_booking_rejects_out_of_range_people_count(people_count):
+    with pytest.raises(ValidationError):
+        BookingCreate(name="Гость", phone="+79000000000", people_count=people_count)
+
+def test_booking_accepts_missing_or_positive_people_count():
+    assert BookingCreate(name="Гость", phone="+79000000000").people_count is None
+    assert BookingCreate(name="Гость", phone="+79000000000", people_count=3).people_count == 3
+
+@pytest.mark.parametrize("people", [-20, 0])
+def test_reserve_rejects_non_positive_people(people):
+    # Raised before the slot is touched, so a negative booking cannot reopen a full day
+    with pytest.raises(BookingRejectedError):
+        asyncio.run(availability_service.reserve(SERVICE, date(2026, 6, 1), people))
+
+@pytest.mark.parametrize("people", [-20, 0])
+def test_release_rejects_non_positive_people(people):
+    with pytest.raises(ValueError):
+        asyncio.run(availability_service.release("service:2026-06-01", people))
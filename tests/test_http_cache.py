@@ -0,0 +1,73 @@
+from datetime import datetime
+from pathlib import Path
+import sys
+
+import pytest
+from starlette.requests import Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cache import CachedResponse
+from http_cache import conditional_response, etag_matches, is_not_modified
+
+MODIFIED = datetime(2026, 5, 1, 12, 0, 0)
+
+def make_request(headers: dict = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/news",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+def make_cached(validator_content=None) -> CachedResponse:
+    cached = CachedResponse.from_content({"title": "Новость", "views": 7}, validator_content=validator_content)
+    cached.last_modified = MODIFIED
+    return cached
+
+@pytest.mark.parametrize("if_none_match, etag, expected", [
+    ('"abc"', '"abc"', True),
+    ('"xyz", "abc"', '"abc"', True),
+    ('W/"abc"', '"abc"', True),
+    ('"abc"', 'W/"abc"', True),
+    ("*", '"abc"', True),
+    ('"abcd"', '"abc"', False),
+    ('"xyz"', 'W/"abc"', False),
+])
+def test_etag_matches_weakly(if_none_match, etag, expected):
+    assert etag_matches(if_none_match, etag) is expected
+
+def test_weak_etag_ignores_fields_outside_the_validator():
+    first = CachedResponse.from_content({"title": "T", "views": 1}, validator_content={"title": "T"})
+    second = CachedResponse.from_content({"title": "T", "views": 2}, validator_content={"title": "T"})
+    assert first.etag.startswith("W/") and first.etag == second.etag
+
+def test_not_modified_by_etag():
+    cached = make_cached()
+    assert is_not_modified(make_request({"If-None-Match": cached.etag}), cached)
+    assert not is_not_modified(make_request({"If-None-Match": '"other"'}), cached)
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    request = make_request({"If-None-Match": '"other"', "If-Modified-Since": "Fri, 01 May 2026 13:00:00 GMT"})
+    assert not is_not_modified(request, make_cached())
+
+@pytest.mark.parametrize("since, expected", [
+    ("Fri, 01 May 2026 12:00:00 GMT", True),
+    ("Fri, 01 May 2026 13:00:00 GMT", True),
+    ("Fri, 01 May 2026 11:59:59 GMT", False),
+    ("not a date", False),
+])
+def test_not_modified_since(since, expected):
+    assert is_not_modified(make_request({"If-Modified-Since": since}), make_cached()) is expected
+
+def test_conditional_response_is_bodiless_304_with_validators():
+    cached = make_cached()
+    response = conditional_response(make_request({"If-None-Match": cached.etag}), cached, "news")
+    assert response.status_code == 304 and response.body == b""
+    assert response.headers["ETag"] == cached.etag
+    assert response.headers["Last-Modified"] == "Fri, 01 May 2026 12:00:00 GMT"
+
+def test_conditional_response_sends_body_when_stale():
+    cached = make_cached()
+    response = conditional_response(make_request(), cached, "news")
+    assert response.status_code == 200 and response.body == cached.body
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import database
+import idempotency
+from idempotency import idempotency_store, request_hash
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+PAYLOAD = {"name": "Гость", "phone": "+79000000000"}
+RECORD_ID = "bookings:key:retry-1"
+
+@pytest.fixture
+def records(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database.db, "database", client["test"])
+    return client["test"][database.COLLECTIONS["idempotency_keys"]]
+
+class Handler:
+    """Counts its calls and answers with the call number"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return {"id": f"booking-{self.calls}"}
+
+def submit(payload, handler, key="retry-1"):
+    return idempotency_store.submit("bookings", payload, handler, idempotency_key=key)
+
+def test_retry_with_same_key_replays_response(records):
+    handler = Handler()
+
+    async def scenario():
+        return await submit(PAYLOAD, handler), await submit(dict(PAYLOAD), handler)
+
+    first, retry = asyncio.run(scenario())
+    assert first == ({"id": "booking-1"}, False)
+    assert retry == ({"id": "booking-1"}, True)
+    assert handler.calls == 1
+
+def test_same_key_with_different_payload_is_rejected(records):
+    handler = Handler()
+
+    async def scenario():
+        await submit(PAYLOAD, handler)
+        await submit({**PAYLOAD, "phone": "+79000000001"}, handler)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status_code == 422
+    assert handler.calls == 1
+
+def test_abandoned_claim_is_taken_over(records):
+    handler = Handler()
+    now = datetime.utcnow()
+
+    async def scenario():
+        # Left behind by a request that died before storing its response
+        await records.insert_one({
+            "_id": RECORD_ID, "fingerprint": request_hash(PAYLOAD), "response": None,
+            "created_at": now - timedelta(minutes=5), "claimed_until": now - timedelta(minutes=4),
+            "expires_at": now + timedelta(hours=1),
+        })
+        return await submit(PAYLOAD, handler)
+
+    assert asyncio.run(scenario()) == ({"id": "booking-1"}, False)
+    assert handler.calls == 1
+
+def test_live_claim_without_response_is_in_progress(records, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    handler = Handler()
+    now = datetime.utcnow()
+
+    async def scenario():
+        await records.insert_one({
+            "_id": RECORD_ID, "fingerprint": request_hash(PAYLOAD), "response": None,
+            "created_at": now, "claimed_until": now + timedelta(minutes=1),
+            "expires_at": now + timedelta(hours=1),
+        })
+        await submit(PAYLOAD, handler)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status_code == 409
+    assert handler.calls == 0
+
+def test_failed_request_releases_its_claim(records):
+    handler = Handler()
+
+    async def failing():
+        raise RuntimeError("database unavailable")
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await submit(PAYLOAD, failing)
+        return await submit(PAYLOAD, handler)
+
+    assert asyncio.run(scenario()) == ({"id": "booking-1"}, False)
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import database
+from models import NewsCreate
+from services import news_service, InvalidCursorError
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+@pytest.fixture
+def mock_database(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database.db, "database", client["test"])
+    # The mock client has no replica set to route reads to
+    monkeypatch.setattr(news_service, "_read_preference", None)
+    return client["test"]
+
+def test_cursor_round_trip():
+    doc = {"_id": "news-1", "publish_date": datetime(2026, 5, 1, 12, 30, 15, 250000)}
+    assert news_service.decode_cursor(news_service.encode_cursor(doc)) == (doc["publish_date"], "news-1")
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(InvalidCursorError):
+        news_service.decode_cursor("not-a-cursor")
+
+def test_pages_reach_documents_created_without_cursor_field(mock_database):
+    async def scenario():
+        collection = mock_database["news"]
+        start = datetime(2026, 1, 1)
+        await collection.insert_many([
+            {"_id": f"seeded-{index}", "title": f"Seeded {index}", "is_published": True,
+             "publish_date": start + timedelta(days=index)}
+            for index in range(5)
+        ])
+        # Created the way the admin route does it: NewsCreate has no publish_date
+        created_id = await news_service.create(
+            NewsCreate(title="Created", excerpt="e", content="c", image="i").dict()
+        )
+        
+        seen, cursor = [], None
+        while True:
+            docs, cursor = await news_service.get_page({"is_published": True}, limit=2, cursor=cursor)
+            seen += [doc["_id"] for doc in docs]
+            if cursor is None:
+                return created_id, seen
+    
+    created_id, seen = asyncio.run(scenario())
+    assert len(seen) == 6 and len(set(seen)) == 6
+    # Newest first: it was created after every seeded publish date
+    assert seen[0] == created_id
@@ -0,0 +1,102 @@
+from pathlib import Path
+import asyncio
+import ipaddress
+import sys
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import ratelimit
+from ratelimit import MemoryBackend, Quota, RateLimiter, client_ip
+
+PROXY = "172.28.0.10"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture
+def trusted_proxy(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", [ipaddress.ip_network(PROXY)])
+
+def make_request(peer: str, headers: dict = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/api/bookings",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": (peer, 40000),
+    })
+
+@pytest.mark.parametrize("value", ["off", "0", ""])
+def test_quota_parse_off(value):
+    assert Quota.parse(value) is None
+
+def test_quota_parse_rate():
+    quota = Quota.parse("5/600")
+    assert quota.capacity == 5 and quota.rate == pytest.approx(5 / 600)
+
+def test_bucket_refills_over_the_period(clock):
+    backend, quota = MemoryBackend(), Quota(2, 60)
+
+    async def hits(count):
+        return [(await backend.hit("login:1.2.3.4", quota)) for _ in range(count)]
+
+    assert asyncio.run(hits(3)) == [(True, 0), (True, 0), (False, 30)]
+    # A token every 30 seconds
+    clock.now += 20
+    assert asyncio.run(hits(1)) == [(False, 10)]
+    clock.now += 10
+    assert asyncio.run(hits(2)) == [(True, 0), (False, 30)]
+
+def test_buckets_are_per_key(clock):
+    backend, quota = MemoryBackend(), Quota(1, 60)
+
+    async def scenario():
+        return [await backend.hit(key, quota) for key in ("login:1.1.1.1", "login:2.2.2.2", "login:1.1.1.1")]
+
+    assert asyncio.run(scenario()) == [(True, 0), (True, 0), (False, 60)]
+
+def test_exhausted_quota_raises_429_with_retry_after(clock):
+    limiter, quota = RateLimiter("memory"), Quota(1, 600)
+    request = make_request("1.2.3.4")
+
+    async def scenario():
+        await limiter.check("bookings", quota, request)
+        await limiter.check("bookings", quota, request)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers["Retry-After"] == "600"
+    assert limiter.metrics()["limited"] == {"bookings": 1}
+
+def test_client_ip_ignores_forwarded_headers_without_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", [])
+    request = make_request(PROXY, {"X-Real-IP": "9.9.9.9", "X-Forwarded-For": "8.8.8.8"})
+    assert client_ip(request) == PROXY
+
+def test_client_ip_ignores_forwarded_headers_from_other_peers(trusted_proxy):
+    request = make_request("5.6.7.8", {"X-Real-IP": "9.9.9.9"})
+    assert client_ip(request) == "5.6.7.8"
+
+def test_client_ip_uses_real_ip_from_trusted_proxy(trusted_proxy):
+    request = make_request(PROXY, {"X-Real-IP": " 9.9.9.9 ", "X-Forwarded-For": "8.8.8.8"})
+    assert client_ip(request) == "9.9.9.9"
+
+def test_client_ip_uses_last_forwarded_hop_from_trusted_proxy(trusted_proxy):
+    # The first entry was sent by the client and can be anything
+    request = make_request(PROXY, {"X-Forwarded-For": "1.1.1.1, 9.9.9.9"})
+    assert client_ip(request) == "9.9.9.9"
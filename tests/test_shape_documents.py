@@ -0,0 +1,42 @@
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import database
+from models import BlogPostCreate, BlogPostSummary, NewsSummary
+from services import blog_service, shape_documents
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+def test_shape_fills_defaults_of_missing_fields():
+    # Stored before views, author and tags were written on create
+    doc = {"_id": "post", "title": "T", "slug": "t", "excerpt": "e", "image": "i",
+           "publish_date": datetime(2026, 5, 1)}
+    [shaped] = shape_documents([doc], BlogPostSummary, blog_service.defaults())
+    assert shaped["id"] == "post" and shaped["views"] == 0 and shaped["tags"] == []
+
+def test_shape_rejects_document_missing_required_field():
+    with pytest.raises(ValidationError):
+        shape_documents([{"_id": "news", "title": "T", "excerpt": "e", "image": "i"}], NewsSummary)
+
+def test_created_documents_shape_without_validation(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database.db, "database", client["test"])
+    monkeypatch.setattr(blog_service, "_read_preference", None)
+
+    async def scenario():
+        post_id = await blog_service.create(
+            BlogPostCreate(title="T", slug="t", excerpt="e", content="c", image="i").dict()
+        )
+        return await blog_service.get_by_id(post_id)
+
+    doc = asyncio.run(scenario())
+    assert doc["views"] == 0 and isinstance(doc["publish_date"], datetime)
+    [shaped] = shape_documents([doc], BlogPostSummary)
+    assert shaped["views"] == 0